@@ -10,8 +10,15 @@ import os
 import re
 import time
 import math
+import heapq
+from bisect import bisect_left
+import mmap
+import struct
+from array import array
 import asyncio
 import logging
+import secrets
+import socket
 import urllib.parse
 from datetime import datetime, timezone, timedelta
 from threading import Thread
@@ -24,14 +31,20 @@ from bs4 import BeautifulSoup # For Google Spell Check
 from flask import Flask
 
 # Pyrogram
-from pyrogram import Client, filters
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from pyrogram import Client, filters, idle
+from pyrogram.enums import ParseMode
+from pyrogram.types import (
+    Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+)
 from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
 
 # Database & Search
 from motor.motor_asyncio import AsyncIOMotorClient # Async DB
-from pymongo import MongoClient, ASCENDING # Sync DB for indexing only
+from pymongo import ASCENDING, UpdateOne, IndexModel, ReturnDocument
+from pymongo.errors import CollectionInvalid
 from fuzzywuzzy import process, fuzz # Fuzzy Logic
+import Levenshtein # Edit Distance (python-Levenshtein)
 from marshmallow import Schema, fields, ValidationError # Schema Validation
 
 # ------------------- কনফিগারেশন -------------------
@@ -39,17 +52,65 @@ API_ID = int(os.getenv("API_ID"))
 API_HASH = os.getenv("API_HASH")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
-RESULTS_COUNT = int(os.getenv("RESULTS_COUNT", 10))
+RESULTS_COUNT = int(os.getenv("RESULTS_COUNT", 10)) # প্রতি পেজে কতগুলো রেজাল্ট
+MAX_RESULTS = int(os.getenv("MAX_RESULTS", 50)) # এক সার্চে মোট কতগুলো রেজাল্ট (পেজিনেশন)
+RESULT_CACHE_TTL = 300 # রেজাল্ট সেট কতক্ষণ মেমোরিতে থাকবে (সেকেন্ড), রেজাল্ট মেসেজও এই সময় পরে ডিলিট হয়
+RESULT_CACHE_MAX = 5000
+CORPUS_MEMORY_BUDGET_MB = int(os.getenv("CORPUS_MEMORY_BUDGET_MB", 64)) # ফাজি কর্পাসের সর্বোচ্চ মেমোরি
+INLINE_INDEX_BUDGET_MB = int(os.getenv("INLINE_INDEX_BUDGET_MB", 128)) # ইনলাইন টাইটেল ইনডেক্সের সর্বোচ্চ মেমোরি (আনুমানিক)
+SEARCH_INDEX_BATCH = 2000   # স্টার্টআপে ক্যাটালগ কতগুলো করে মুভির ব্যাচে ইনডেক্সে যাবে
+CORPUS_SNAPSHOT_PATH = os.getenv("CORPUS_SNAPSHOT_PATH", "title_corpus.snapshot") # খালি রাখলে স্ন্যাপশট বন্ধ
+CORPUS_MERGE_INTERVAL = 600 # কত সেকেন্ড পর পর overlay দেখা হবে
+CORPUS_MERGE_MIN = 1000     # overlay তে এর বেশি পরিবর্তন জমলে নতুন বেস + স্ন্যাপশটে মার্জ
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(",")))
 DATABASE_URL = os.getenv("DATABASE_URL")
 UPDATE_CHANNEL = os.getenv("UPDATE_CHANNEL", "https://t.me/TGLinkBase")
 TMDB_API_KEY = os.getenv("TMDB_API_KEY") # [NEW] TMDB API Key
+GOOGLE_SPELL_CHECK = os.getenv("GOOGLE_SPELL_CHECK", "True").lower() == "true" # Last resort (Network)
 START_PIC = os.getenv("START_PIC", "https://i.ibb.co/prnGXMr3/photo-2025-05-16-05-15-45-7504908428624527364.jpg")
 BROADCAST_PIC = os.getenv("BROADCAST_PIC", "https://telegra.ph/file/18659550b694b47000787.jpg")
 
+# [CONFIG] ফোনেটিক স্টেজ সেটিংস
+PHONETIC_MIN_KEY_LENGTH = 2  # এর চেয়ে ছোট কী ("the" -> T) শুধু তখনই রাখা হবে যখন টাইটেলে আর কোনো কী নেই
+PHONETIC_MIN_SCORE = 80      # ফোনেটিক ক্যান্ডিডেট টাইটেলের সাথে কুয়েরির সর্বনিম্ন মিল (partial ratio)
+
+# [CONFIG] সার্চ লগ ও লার্নড কারেকশন সেটিংস
+SEARCH_LOG_FLUSH_INTERVAL = 10      # সেকেন্ড পর পর লগ ব্যাচ আকারে সেভ হবে
+SEARCH_LOG_MAX_BYTES = 50 * 1024 * 1024  # Capped Collection সাইজ
+CORRECTION_REBUILD_INTERVAL = 600   # কারেকশন ম্যাপ রিবিল্ড
+CORRECTION_PAIR_WINDOW = 60         # মিস -> হিট এর মধ্যে সর্বোচ্চ সময় (সেকেন্ড)
+CORRECTION_OPEN_WINDOW = 300        # সার্চের পর কত সেকেন্ডের মধ্যে মুভি ওপেন হলে সেটা ওই সার্চের হিট
+CORRECTION_MIN_COUNT = 2            # ইউজার থেকে শেখা কারেকশন কতজন আলাদা ইউজার নিশ্চিত করলে ব্যবহার হবে
+
+# [CONFIG] ইনলাইন মোড সেটিংস
+INLINE_RESULTS_COUNT = 20   # Telegram সর্বোচ্চ 50
+INLINE_CACHE_TIME = 30      # Telegram সার্ভারে রেজাল্ট ক্যাশ (সেকেন্ড)
+
 # [CONFIG] অটো মেসেজ সেটিংস
 AUTO_MSG_INTERVAL = 250  
 AUTO_MSG_DELETE_TIME = 300 
+AUTO_MSG_CONCURRENCY = 10   # একসাথে কতগুলো গ্রুপে পাঠাবে
+AUTO_MSG_RATE = 20          # প্রতি সেকেন্ডে সর্বোচ্চ মেসেজ (Shared Rate Limiter)
+AUTO_MSG_BATCH = 500        # এক রাউন্ডে সর্বোচ্চ কতগুলো গ্রুপ নিবে
+AUTO_MSG_TICK = 10          # ডিউ গ্রুপ চেক করার বিরতি (সেকেন্ড)
+
+# [CONFIG] জব কিউ ও প্রসেস রোল
+# all = আপডেট + ব্যাকগ্রাউন্ড জব একই প্রসেসে (আগের মতো), bot = শুধু আপডেট (জব কিউতে পাঠাবে), worker = শুধু জব
+BOT_ROLE = os.getenv("BOT_ROLE", "all").lower()
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+JOB_LEASE_SECONDS = 60      # এই সময়ের মধ্যে হার্টবিট না এলে অন্য worker জব নিতে পারবে
+JOB_POLL_INTERVAL = 2       # কিউ খালি থাকলে কত সেকেন্ড পর আবার দেখবে
+JOB_CONCURRENCY = 4         # এক worker প্রসেসে একসাথে কতগুলো জব
+JOB_MAX_ATTEMPTS = 3
+JOB_RETENTION = 86400       # শেষ হওয়া জব কতক্ষণ থাকবে (TTL)
+BROADCAST_CHECKPOINT = 500  # ব্রডকাস্টে প্রতি এতজন ইউজার পর জবে প্রগ্রেস (শেষ _id) সেভ হবে
+DELETE_BATCH = 500          # এক রাউন্ডে কতগুলো শিডিউলড ডিলিট
+DUPLICATE_MIN_SCORE = 92    # নতুন পোস্টের টাইটেল আগের এন্ট্রির সাথে এতটা মিললে (একই সাল) ভ্যারিয়েন্ট হবে
+
+# [CONFIG] অ্যাডমিন অ্যালার্ট ডাইজেস্ট সেটিংস
+ADMIN_ALERT_INTERVAL = 60       # কত সেকেন্ড পর পর ডাইজেস্ট যাবে
+ADMIN_ALERT_MAX_PER_DIGEST = 20 # এক ডাইজেস্টে সর্বোচ্চ আলাদা অ্যালার্ট (বাকিগুলো সারাংশে)
+ADMIN_ALERT_RATE = 5            # অ্যাডমিনদের কাছে প্রতি সেকেন্ডে সর্বোচ্চ মেসেজ
 
 AUTO_MESSAGE_TEXT = """
 **🔔 নিয়মিত আপডেট!**
@@ -64,7 +125,11 @@ AUTO_MESSAGE_TEXT = """
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Client("movie_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+if BOT_ROLE == "worker":
+    # worker এর নিজস্ব সেশন, আপডেট রিসিভ করবে না
+    app = Client(f"movie_bot_worker_{WORKER_ID}", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, in_memory=True, no_updates=True)
+else:
+    app = Client("movie_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
 
 # ------------------- MongoDB (Async Motor) & Schema -------------------
 # Motor Client (Non-blocking - Main Operations)
@@ -77,29 +142,75 @@ groups_col = db["groups"]
 settings_col = db["settings"]
 requests_col = db["requests"]
 feedback_col = db["feedback"]
+spell_vocab_col = db["spell_vocab"] # সফল সার্চের শব্দ (Spell Corrector এর জন্য)
+search_logs_col = db["search_logs"] # Capped Collection (সার্চ ইভেন্ট লগ)
+corrections_col = db["corrections"] # শেখা কারেকশন জোড়া (miss, target) -> ইউজার সংখ্যা
+jobs_col = db["jobs"] # ব্যাকগ্রাউন্ড জব কিউ
+scheduled_deletes_col = db["scheduled_deletes"] # পরে ডিলিট হবে এমন মেসেজ
+
+# [UPDATED] ইনডেক্স ম্যানেজমেন্ট (Async) - ইমপোর্টের সময় ব্লক করবে না, স্টার্টআপে ব্যাকগ্রাউন্ডে চলবে
+INDEX_SPECS = {
+    "movies": [
+        ([("message_id", ASCENDING)], {"unique": True}),
+        ([("title_clean", ASCENDING)], {}),
+        ([("language", ASCENDING)], {}),
+        ([("views_count", ASCENDING)], {}),
+        ([("title_phonetic", ASCENDING)], {}), # Multikey (Array)
+        ([("file_unique_id", ASCENDING)], {"sparse": True}),
+        ([("variants.message_id", ASCENDING)], {"sparse": True}),
+        ([("variants.file_unique_id", ASCENDING)], {"sparse": True}),
+    ],
+    "search_logs": [
+        ([("time", ASCENDING)], {}),
+    ],
+    "groups": [
+        ([("next_auto_msg", ASCENDING)], {}),
+    ],
+    "jobs": [
+        ([("status", ASCENDING), ("run_at", ASCENDING)], {}),
+        ([("finished", ASCENDING)], {"expireAfterSeconds": JOB_RETENTION}),
+    ],
+    "corrections": [
+        ([("miss", ASCENDING), ("target", ASCENDING)], {"unique": True, "partialFilterExpression": {"miss": {"$exists": True}}}),
+    ],
+    "scheduled_deletes": [
+        ([("run_at", ASCENDING)], {}),
+    ],
+}
+
+async def ensure_indexes():
+    """আগে থেকে থাকা ইনডেক্স চেক করে শুধু যেগুলো নেই সেগুলো তৈরি করবে"""
+    try:
+        await db.create_collection("search_logs", capped=True, size=SEARCH_LOG_MAX_BYTES)
+    except CollectionInvalid:
+        pass  # আগে থেকেই আছে (bot ও worker একসাথে স্টার্ট হলে অন্যজন বানিয়ে ফেলতে পারে)
+    except Exception as e:
+        logger.error(f"Search Log Collection Error: {e}")
 
-# Sync Client (শুধুমাত্র ইনডেক্স তৈরির জন্য একবার রান হবে)
-try:
-    sync_client = MongoClient(DATABASE_URL)
-    sync_db = sync_client["movie_bot"]
-    sync_db.movies.create_index("message_id", unique=True, background=True)
-    sync_db.movies.create_index([("title_clean", ASCENDING)], background=True)
-    sync_db.movies.create_index("language", background=True)
-    sync_db.movies.create_index([("views_count", ASCENDING)], background=True)
-    print("✅ Database Indexes Created Successfully!")
-except Exception as e:
-    print(f"⚠️ Index Error: {e}")
+    created = 0
+    for col_name, specs in INDEX_SPECS.items():
+        existing = {tuple(tuple(k) for k in info["key"]) for info in (await db[col_name].index_information()).values()}
+        missing = [IndexModel(keys, background=True, **options) for keys, options in specs if tuple(keys) not in existing]
+        if missing:
+            await db[col_name].create_indexes(missing)
+            created += len(missing)
+    print(f"✅ Database Indexes Checked! (New: {created})")
 
 # Marshmallow Schema (Data Validation)
 class MovieSchema(Schema):
     message_id = fields.Int(required=True)
     title = fields.Str(required=True)
     title_clean = fields.Str(required=True)
+    title_phonetic = fields.List(fields.Str(), load_default=list)
     full_caption = fields.Str()
+    caption_html = fields.Str(allow_none=True)
     year = fields.Int(allow_none=True)
     language = fields.Str(allow_none=True)
     views_count = fields.Int(load_default=0)
     thumbnail_id = fields.Str(allow_none=True)
+    file_id = fields.Str(allow_none=True)
+    file_unique_id = fields.Str(allow_none=True)
+    media_type = fields.Str(allow_none=True)
     date = fields.DateTime()
 
 movie_schema = MovieSchema()
@@ -111,13 +222,30 @@ async def init_settings():
         {"$setOnInsert": {"value": True}},
         upsert=True
     )
+    # সব সেটিংস মেমোরিতে ক্যাশ করা (প্রতি রিকোয়েস্টে DB কল লাগবে না)
+    async for setting in settings_col.find({}):
+        settings_cache[setting["key"]] = setting.get("value")
+
+settings_cache = {}
+
+async def get_setting(key, default=None):
+    if key not in settings_cache:
+        setting = await settings_col.find_one({"key": key})
+        settings_cache[key] = setting.get("value", default) if setting else default
+    return settings_cache[key]
+
+async def set_setting(key, value):
+    await settings_col.update_one({"key": key}, {"$set": {"value": value}}, upsert=True)
+    settings_cache[key] = value
 
 # ------------------- Flask অ্যাপ -------------------
 flask_app = Flask(__name__)
 @flask_app.route("/")
 def home():
     return "Advanced Bot is running with Motor, BS4 & TMDB!"
-Thread(target=lambda: flask_app.run(host="0.0.0.0", port=8080)).start() 
+
+def start_flask():
+    Thread(target=lambda: flask_app.run(host="0.0.0.0", port=8080), daemon=True).start()
 
 thread_pool_executor = ThreadPoolExecutor(max_workers=5)
 
@@ -141,7 +269,7 @@ STOP_WORDS = [
     "karo", "koro", "ta", "dorkar", "urgent", "movies", "link"
 ]
 
-def clean_text(text):
+def clean_tokens(text):
     # সব ছোট হাতের করা
     text = text.lower()
     # সাল (Year) রেখে বাকি স্পেশাল ক্যারেক্টার রিমুভ (যেমন 1999 বা 2024 রিমুভ হবে না)
@@ -151,14 +279,51 @@ def clean_text(text):
     
     words = text.split()
     # স্টপ ওয়ার্ড ফিল্টারিং
-    filtered_words = [w for w in words if w not in STOP_WORDS]
-    
+    return [w for w in words if w not in STOP_WORDS]
+
+def clean_text(text):
     # স্ট্রিং জয়েন করে রিটার্ন করা
-    return "".join(filtered_words)
+    return "".join(clean_tokens(text))
+
+# [NEW] ফোনেটিক কী (Banglish বানান ভুল ধরার জন্য)
+# একই রকম উচ্চারণের অক্ষরগুলোকে এক করে, তারপর প্রথম অক্ষর বাদে সব স্বরবর্ণ বাদ দেয়।
+# যেমন: "animel" ও "animal" -> "ANML", "pushpa" ও "puspa" -> "PSP"
+PHONETIC_RULES = [
+    ("ph", "f"), ("ck", "k"), ("sh", "s"), ("ch", "c"), ("kh", "k"), ("gh", "g"),
+    ("bh", "b"), ("dh", "d"), ("th", "t"), ("q", "k"), ("z", "j"), ("w", "v"), ("x", "ks")
+]
+VOWELS = set("aeiouy")
+
+def phonetic_key(word):
+    if word.isdigit():
+        return word
+    for src, dst in PHONETIC_RULES:
+        word = word.replace(src, dst)
+    key = "a" if word[0] in VOWELS else word[0]
+    for ch in word[1:]:
+        if ch in VOWELS or ch == "h" or ch == key[-1]:
+            continue
+        key += ch
+    return key.upper()
+
+def get_phonetic_keys(text):
+    """টাইটেলের প্রতিটি শব্দের ফোনেটিক কী (সংখ্যা আলাদা টোকেন, যেমন pushpa2 -> PSP, 2)"""
+    keys, short_keys = [], []
+    for word in clean_tokens(text):
+        for part in re.findall(r'[a-z]+|\d+', word):
+            key = phonetic_key(part)
+            bucket = keys if part.isdigit() or len(key) >= PHONETIC_MIN_KEY_LENGTH else short_keys
+            if key not in bucket:
+                bucket.append(key)
+    # এক অক্ষরের কী প্রায় সব টাইটেলে মিলে যায়, তবে ছোট টাইটেলে ("Leo" -> L, "RRR" -> R) শুধু সেগুলোই আছে
+    if not any(not key.isdigit() for key in keys):
+        keys += short_keys
+    return keys
+
+LANGUAGES = ["Bengali", "Hindi", "English", "Tamil", "Telugu", "Korean"]
 
 def extract_language(text):
-    langs = ["Bengali", "Hindi", "English", "Tamil", "Telugu", "Korean"]
-    return next((lang for lang in langs if lang.lower() in text.lower()), None)
+    return next((lang for lang in LANGUAGES if lang.lower() in text.lower()), None)
 
 def extract_year(text):
     match = re.search(r'\b(19|20)\d{2}\b', text)
@@ -178,11 +343,12 @@ def get_greeting():
     else: return "GOOD NIGHT 🌙"
 
 async def delete_message_later(chat_id, message_id, delay=300): 
-    await asyncio.sleep(delay)
+    """স্লিপিং টাস্ক নয়, DB তে শিডিউল হবে; worker এর scheduled_deletes জব ডিলিট করবে"""
+    run_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
     try:
-        await app.delete_messages(chat_id, message_id)
-    except Exception:
-        pass
+        await scheduled_deletes_col.insert_one({"chat_id": chat_id, "message_id": message_id, "run_at": run_at})
+    except Exception as e:
+        logger.error(f"Schedule Delete Error: {e}")
 
 # ------------------- External APIs (TMDB & Google) -------------------
 
@@ -259,27 +425,854 @@ def find_corrected_matches(query_clean, all_movie_titles_data, score_cutoff=75,
                     
     return sorted(corrected_suggestions, key=lambda x: x["score"], reverse=True)
 
-# ------------------- অটো গ্রুপ মেসেঞ্জার (Async Motor) -------------------
-async def auto_group_messenger():
-    print("✅ অটো গ্রুপ মেসেজ সিস্টেম চালু হয়েছে (Async)...")
+# [NEW] পুরোনো মুভিগুলোর জন্য ফোনেটিক কী ব্যাকফিল (একবার রান হলেই যথেষ্ট)
+async def backfill_phonetic_keys(batch_size=1000):
+    updated = 0
+    ops = []
+    # খালি কী (আগে ছোট টাইটেলের কী বাদ পড়ত) থাকলেও আবার হিসাব হবে
+    async for movie in movies_col.find({"$or": [{"title_phonetic": {"$exists": False}}, {"title_phonetic": {"$size": 0}}]}, {"title": 1}):
+        ops.append(UpdateOne({"_id": movie["_id"]}, {"$set": {"title_phonetic": get_phonetic_keys(movie.get("title") or "")}}))
+        if len(ops) >= batch_size:
+            await movies_col.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        await movies_col.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    if updated:
+        print(f"✅ Phonetic Keys Backfilled: {updated}")
+
+# ------------------- কমপ্যাক্ট টাইটেল কর্পাস (Fuzzy Search এর জন্য) -------------------
+class TitleCorpus:
+    """
+    প্রতি কুয়েরিতে সব মুভির dict লোড না করে, সব title_clean ও title একটানা দুটি বাফারে
+    (অফসেট অ্যারে সহ) এবং message_id / views_count / language টাইপড অ্যারেতে রাখা হয়।
+    স্ন্যাপশট ফাইল থেকে mmap করে লোড করা যায়, তাই স্টার্টআপে কোনো পার্সিং লাগে না।
+    স্ন্যাপশটের পরে যোগ/ডিলিট হওয়া মুভি ছোট একটা overlay (dict) তে থাকে, যা বাজেটের মধ্যেই গোনা হয়
+    এবং বড় হলে নতুন বেস কর্পাসে মার্জ হয়।
+    """
+    MAGIC = b"BFCORP1\0"
+    HEADER = struct.Struct("<8sQQQ")  # magic, count, clean_len, title_len
+    LANG_CODES = [None] + LANGUAGES
+    OVERLAY_ENTRY_OVERHEAD = 160  # overlay এন্ট্রির dict স্লট + tuple + str হেডার (আনুমানিক বাইট)
+    REMOVED_ENTRY_OVERHEAD = 64
+
+    def __init__(self, budget_bytes=CORPUS_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.clean_buf = bytearray()
+        self.clean_offsets = array("I", [0])
+        self.title_buf = bytearray()
+        self.title_offsets = array("I", [0])
+        self.message_ids = array("q")
+        self.views = array("I")
+        self.languages = array("B")
+        self.extra = {}          # message_id -> (message_id, title, title_clean, views_count, language)
+        self.extra_bytes = 0
+        self.removed = set()     # বেস থেকে বাদ পড়া message_id
+        self.truncated = False
+        self.ready = False
+
+    def __len__(self):
+        return len(self.message_ids) + len(self.extra)
+
+    def base_usage(self):
+        arrays = (self.clean_buf, self.clean_offsets, self.title_buf, self.title_offsets,
+                  self.message_ids, self.views, self.languages)
+        return sum(memoryview(a).nbytes for a in arrays)
+
+    def memory_usage(self):
+        return self.base_usage() + self.extra_bytes + len(self.removed) * self.REMOVED_ENTRY_OVERHEAD
+
+    def overlay_size(self):
+        return len(self.extra) + len(self.removed)
+
+    def _overlay_entry_size(self, entry):
+        return len(entry[1] or "") + len(entry[2] or "") + self.OVERLAY_ENTRY_OVERHEAD
+
+    def _title_at(self, i):
+        return str(self.title_buf[self.title_offsets[i]:self.title_offsets[i + 1]], "utf-8")
+
+    def _clean_at(self, i):
+        return str(self.clean_buf[self.clean_offsets[i]:self.clean_offsets[i + 1]], "utf-8")
+
+    def append(self, message_id, title, title_clean, views_count=0, language=None):
+        """বেস কর্পাসে যোগ করবে। বাজেট পার হলে False রিটার্ন করবে।"""
+        clean = (title_clean or "").encode()
+        raw = (title or "").encode()
+        if self.memory_usage() + len(clean) + len(raw) + 21 > self.budget_bytes:
+            self.truncated = True
+            return False
+        self.clean_buf += clean
+        self.clean_offsets.append(len(self.clean_buf))
+        self.title_buf += raw
+        self.title_offsets.append(len(self.title_buf))
+        self.message_ids.append(message_id)
+        self.views.append(min(max(views_count or 0, 0), 0xFFFFFFFF))
+        self.languages.append(self.LANG_CODES.index(language) if language in self.LANG_CODES else 0)
+        return True
+
+    def add(self, message_id, title, title_clean, views_count=0, language=None):
+        """নতুন/এডিট হওয়া মুভি overlay তে যোগ হবে। বাজেট পার হলে False রিটার্ন করবে।"""
+        entry = (message_id, title, title_clean, views_count, language)
+        old = self.extra.get(message_id)
+        grow = self._overlay_entry_size(entry) - (self._overlay_entry_size(old) if old else 0)
+        if self.memory_usage() + grow > self.budget_bytes:
+            self.truncated = True
+            return False
+        self.extra[message_id] = entry
+        self.extra_bytes += grow
+        self.removed.discard(message_id)
+        return True
+
+    def remove(self, message_id):
+        old = self.extra.pop(message_id, None)
+        if old:
+            self.extra_bytes -= self._overlay_entry_size(old)
+        self.removed.add(message_id)
+
+    def _merged_entries(self):
+        """বেস (ভিউ অনুযায়ী সাজানো) ও overlay দুটোই বেশি ভিউ আগে রেখে একসাথে দেবে"""
+        extra = sorted(self.extra.values(), key=lambda e: e[3] or 0, reverse=True)
+        skip = set(self.removed)
+        skip.update(e[0] for e in extra)
+        j = 0
+        for i in range(len(self.message_ids)):
+            while j < len(extra) and (extra[j][3] or 0) > self.views[i]:
+                yield extra[j]
+                j += 1
+            if self.message_ids[i] in skip:
+                continue
+            yield (self.message_ids[i], self._title_at(i), self._clean_at(i), self.views[i], self.LANG_CODES[self.languages[i]])
+        yield from extra[j:]
+
+    def merged(self):
+        """overlay মার্জ করা নতুন বেস কর্পাস (overlay খালি) রিটার্ন করবে"""
+        corpus = TitleCorpus(self.budget_bytes)
+        for entry in self._merged_entries():
+            if not corpus.append(*entry):
+                break
+        corpus.ready = True
+        return corpus
+
+    @staticmethod
+    def _push(heap, item, limit):
+        if len(heap) < limit:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def search(self, query_clean, score_cutoff=75, limit=5):
+        """ফাজি স্কোরিং (Token Set Ratio), কোনো অস্থায়ী dict/list ছাড়াই top-N রাখবে"""
+        # লুপ থ্রেড overlay বদলাতে পারে, তাই এই সার্চের জন্য একটা কপি
+        extra = list(self.extra.values())
+        skip = set(self.removed)
+        skip.update(e[0] for e in extra)
+        heap = []
+        clean_buf, offsets, message_ids = self.clean_buf, self.clean_offsets, self.message_ids
+        for i in range(len(message_ids)):
+            if skip and message_ids[i] in skip:
+                continue
+            score = fuzz.token_set_ratio(query_clean, str(clean_buf[offsets[i]:offsets[i + 1]], "utf-8"))
+            if score >= score_cutoff:
+                self._push(heap, (score, -i), limit)
+        base_count = len(message_ids)
+        for j, entry in enumerate(extra):
+            score = fuzz.token_set_ratio(query_clean, entry[2] or "")
+            if score >= score_cutoff:
+                self._push(heap, (score, -(base_count + j)), limit)
+
+        # একই স্কোরে আগের পজিশন (বেশি ভিউ) আগে
+        results = []
+        for score, neg_pos in sorted(heap, reverse=True):
+            i = -neg_pos
+            if i < base_count:
+                results.append({
+                    "title": self._title_at(i),
+                    "message_id": message_ids[i],
+                    "language": self.LANG_CODES[self.languages[i]],
+                    "views_count": self.views[i],
+                    "score": score
+                })
+            else:
+                message_id, title, _, views_count, language = extra[i - base_count]
+                results.append({"title": title, "message_id": message_id, "language": language, "views_count": views_count, "score": score})
+        return results
+
+    def save(self, path):
+        """স্ন্যাপশট ফাইলে লিখবে (পরের স্টার্টআপে mmap হবে)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(self.message_ids), len(self.clean_buf), len(self.title_buf)))
+            for section in (self.clean_offsets, self.title_offsets, self.message_ids, self.views, self.languages,
+                            self.clean_buf, self.title_buf):
+                data = memoryview(section).cast("B")
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, budget_bytes=CORPUS_MEMORY_BUDGET_MB * 1024 * 1024):
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        magic, count, clean_len, title_len = cls.HEADER.unpack_from(view)
+        if magic != cls.MAGIC:
+            raise ValueError("Invalid corpus snapshot")
+
+        corpus = cls(budget_bytes)
+        pos = cls.HEADER.size
+        def take(nbytes, fmt):
+            nonlocal pos
+            section = view[pos:pos + nbytes].cast(fmt)
+            pos += nbytes + (-nbytes % 8)
+            return section
+        corpus.clean_offsets = take(4 * (count + 1), "I")
+        corpus.title_offsets = take(4 * (count + 1), "I")
+        corpus.message_ids = take(8 * count, "q")
+        corpus.views = take(4 * count, "I")
+        corpus.languages = take(count, "B")
+        corpus.clean_buf = take(clean_len, "B")
+        corpus.title_buf = take(title_len, "B")
+        corpus.ready = True
+        return corpus
+
+title_corpus = TitleCorpus()
+
+CORPUS_FIELDS = {"title": 1, "title_clean": 1, "message_id": 1, "views_count": 1, "language": 1}
+
+def save_corpus_snapshot(corpus):
+    if not CORPUS_SNAPSHOT_PATH: return
+    try:
+        corpus.save(CORPUS_SNAPSHOT_PATH)
+    except OSError as e:
+        logger.error(f"Corpus Snapshot Error: {e}")
+
+class CorpusDiff:
+    """
+    স্ট্রিম হওয়া ক্যাটালগ বেস কর্পাসের সাথে মেলাবে: বেসে নেই বা title_clean বদলেছে -> add,
+    শেষে বেসের যেগুলো ক্যাটালগে পাওয়া যায়নি -> remove। বেস শুধু পড়া হয়, তাই থ্রেডে চালানো যায়।
+    """
+    def __init__(self, corpus):
+        self.corpus = corpus
+        ids = corpus.message_ids
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        self.sorted_ids = array("q", (ids[i] for i in order))
+        self.positions = array("I", order)
+        self.seen = bytearray(len(ids))
+        self.adds = []
+
+    def feed(self, movie):
+        message_id = movie["message_id"]
+        k = bisect_left(self.sorted_ids, message_id)
+        if k < len(self.sorted_ids) and self.sorted_ids[k] == message_id:
+            i = self.positions[k]
+            self.seen[i] = 1
+            if self.corpus._clean_at(i) == (movie.get("title_clean") or ""):
+                return
+        self.adds.append((message_id, movie.get("title"), movie.get("title_clean"),
+                          movie.get("views_count", 0), movie.get("language")))
+
+    def updates(self):
+        """[(মেথড, args)] - ক্যাটালগ views অনুযায়ী স্ট্রিম হয়, তাই adds এ জনপ্রিয়গুলো আগে"""
+        removes = [("remove", (self.corpus.message_ids[i],)) for i in range(len(self.seen)) if not self.seen[i]]
+        return removes + [("add", args) for args in self.adds]
+
+async def load_corpus_snapshot():
+    """স্ন্যাপশট mmap করে সাথে সাথে ফাজি সার্চ চালু, স্ন্যাপশটের পরের মুভিগুলো overlay তে"""
+    if not CORPUS_SNAPSHOT_PATH or not os.path.exists(CORPUS_SNAPSHOT_PATH): return
+    start_index_build()
+    try:
+        corpus = TitleCorpus.load(CORPUS_SNAPSHOT_PATH)
+        last_id = max(corpus.message_ids) if len(corpus.message_ids) else 0
+        async for movie in movies_col.find({"message_id": {"$gt": last_id}}, CORPUS_FIELDS):
+            corpus.add(movie["message_id"], movie.get("title"), movie.get("title_clean"), movie.get("views_count", 0), movie.get("language"))
+    except Exception:
+        finish_index_build()
+        raise
+    if title_corpus.ready:
+        finish_index_build()
+    else:
+        finish_index_build(corpus=corpus)
+        print(f"✅ Title Corpus Snapshot Loaded: {len(corpus)} titles, {corpus.memory_usage() / 1024 / 1024:.1f} MB (mmap)")
+
+# ------------------- অফলাইন স্পেলিং কারেক্টর (SymSpell Style) -------------------
+class SpellCorrector:
+    """
+    Symmetric Delete বানান সংশোধনকারী (নেটওয়ার্ক ছাড়াই "Did you mean")।
+    প্রতিটি শব্দের ডিলিট-ভ্যারিয়েন্ট আগে থেকে ইনডেক্স করা থাকে, তাই লুকআপে শুধু
+    কুয়েরির ডিলিট-ভ্যারিয়েন্ট ডিকশনারিতে খুঁজলেই ক্যান্ডিডেট পাওয়া যায়।
+    """
+    def __init__(self, max_edit_distance=2, prefix_length=7):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words = {}    # word -> frequency
+        self.deletes = {}  # delete variant -> set(words)
+
+    def _edits(self, word):
+        word = word[:self.prefix_length]
+        result = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            next_frontier = set()
+            for w in frontier:
+                if len(w) <= 1:
+                    continue
+                for i in range(len(w)):
+                    next_frontier.add(w[:i] + w[i + 1:])
+            next_frontier -= result
+            result |= next_frontier
+            frontier = next_frontier
+        return result
+
+    def add_word(self, word, count=1):
+        if len(word) < 3 or word.isdigit():
+            return
+        if word in self.words:
+            self.words[word] += count
+            return
+        self.words[word] = count
+        for variant in self._edits(word):
+            self.deletes.setdefault(variant, set()).add(word)
+
+    def lookup(self, word):
+        """সবচেয়ে কাছের শব্দ রিটার্ন করবে (কম এডিট ডিস্টেন্স, তারপর বেশি ফ্রিকোয়েন্সি)"""
+        if word in self.words or len(word) < 3 or word.isdigit():
+            return word
+        candidates = set()
+        for variant in self._edits(word):
+            candidates |= self.deletes.get(variant, set())
+        best, best_rank = None, None
+        for candidate in candidates:
+            distance = Levenshtein.distance(word, candidate)
+            if distance > self.max_edit_distance:
+                continue
+            rank = (distance, -self.words[candidate])
+            if best_rank is None or rank < best_rank:
+                best, best_rank = candidate, rank
+        return best or word
+
+    def correct(self, text):
+        """পুরো কুয়েরির প্রতিটি টোকেন সংশোধন করে (tokens, corrected_tokens) রিটার্ন করবে"""
+        tokens = clean_tokens(text)
+        return tokens, [self.lookup(t) for t in tokens]
+
+spell_corrector = SpellCorrector()
+
+class IndexBuild:
+    """
+    ইনডেক্স বানানোর সময় লাইভ অবজেক্টে হওয়া পরিবর্তনগুলো রাখবে, যেন স্বাপের আগে নতুন অবজেক্টে আবার চালানো যায়।
+    বিল্ডের মাঝে সব মুভি ডিলিট (reset) হলে বানানো title_index / title_corpus বাতিল হবে।
+    """
+    def __init__(self):
+        self.updates = []  # [(লাইভ অবজেক্ট, মেথড, args)]
+        self.reset = False
+
+index_build = None  # None = কোনো বিল্ড চলছে না
+
+def apply_index_update(index, method, *args):
+    """লাইভ ইনডেক্সে (spell_corrector / title_index / title_corpus) পরিবর্তন, বিল্ড চললে বাফারেও রাখবে"""
+    getattr(index, method)(*args)
+    if index_build is not None:
+        index_build.updates.append((index, method, args))
+
+def start_index_build():
+    global index_build
+    index_build = IndexBuild()
+
+def finish_index_build(corrector=None, index=None, corpus=None):
+    """বাফার করা পরিবর্তন নতুন অবজেক্টে চালিয়ে গ্লোবালগুলো স্বাপ করবে (মাঝে কোনো await নেই)"""
+    global index_build, spell_corrector, title_index, title_corpus
+    build, index_build = index_build, None
+    if build.reset:
+        # বিল্ডের মাঝে সব মুভি ডিলিট হয়েছে, লাইভ (খালি করা) ইনডেক্সই ঠিক আছে
+        index = corpus = None
+    # নতুন অবজেক্ট লাইভটাই হলেও (স্ন্যাপশট রাখা হলে) আবার চালানো হবে, যেন পুরনো ক্যাটালগের diff লাইভ পরিবর্তন মুছে না দেয়
+    replacements = [(old, new) for old, new in ((spell_corrector, corrector), (title_index, index), (title_corpus, corpus))
+                    if new is not None]
+    for live, method, args in build.updates:
+        for old, new in replacements:
+            if live is old:
+                getattr(new, method)(*args)
+    if corrector is not None: spell_corrector = corrector
+    if index is not None: title_index = index
+    if corpus is not None: title_corpus = corpus
+
+async def load_search_indexes():
+    """
+    স্টার্টআপে একবার ক্যাটালগ পড়ে স্পেল কারেক্টর (ক্যাটালগ + সফল কুয়েরি) ও
+    ইনলাইন টাইটেল ইনডেক্স বানাবে (থ্রেডে, লুপ ব্লক না করে)
+    """
+    start_index_build()
+    try:
+        corrector, index, corpus = await build_search_indexes()
+    except Exception:
+        finish_index_build()
+        raise
+    finish_index_build(corrector, index, corpus)
+    print(f"✅ Spell Corrector Ready: {len(spell_corrector.words)} words")
+    print(f"✅ Title Index Ready: {len(title_index.entries)} titles, {title_index.memory_usage() / 1024 / 1024:.1f}/{INLINE_INDEX_BUDGET_MB} MB")
+    print(f"✅ Title Corpus Ready: {len(title_corpus)} titles, {title_corpus.memory_usage() / 1024 / 1024:.1f}/{CORPUS_MEMORY_BUDGET_MB} MB")
+    if title_corpus.truncated:
+        logger.warning("Title Corpus memory budget reached, less viewed titles skipped from fuzzy search")
+    if title_index.truncated:
+        logger.warning("Title Index memory budget reached, less viewed titles skipped from inline search")
+
+def feed_search_indexes(movies, corrector, index, corpus, corpus_diff):
+    """এক ব্যাচ মুভি নতুন (এখনো অন্য কেউ দেখছে না এমন) ইনডেক্সগুলোতে যোগ করবে, থ্রেডে চলে"""
+    for movie in movies:
+        if "message_id" not in movie: continue
+        title = movie.get("title") or ""
+        for word in clean_tokens(title):
+            corrector.add_word(word)
+        if title and not index.truncated:
+            index.add(movie["message_id"], title, movie.get("views_count", 0))
+        if corpus_diff:
+            corpus_diff.feed(movie)
+        elif not corpus.truncated:
+            corpus.append(movie["message_id"], movie.get("title"), movie.get("title_clean"),
+                          movie.get("views_count", 0), movie.get("language"))
+
+async def build_search_indexes():
+    """
+    ক্যাটালগ views_count অনুযায়ী ব্যাচে স্ট্রিম করে স্পেল কারেক্টর, ইনলাইন ইনডেক্স ও কর্পাস একসাথে বানাবে
+    (পুরো ক্যাটালগ লিস্টে না নিয়ে)। বাজেট শেষ হলেও জনপ্রিয় মুভিগুলো ইনডেক্স ও কর্পাসে থাকবে।
+    """
+    loop = asyncio.get_event_loop()
+    corrector, index = SpellCorrector(), TitleIndex()
+    vocab = [(v["_id"], v.get("count", 1)) async for v in spell_vocab_col.find({})]
+
+    def add_vocab():
+        for word, count in vocab:
+            corrector.add_word(word, count)
+    await loop.run_in_executor(thread_pool_executor, add_vocab)
+
+    # স্ন্যাপশট (বা আগের বেস) থাকলে সেটাই থাকবে, শুধু নতুন/বদলানো/ডিলিট হওয়া মুভি overlay তে
+    corpus = title_corpus
+    corpus_diff = CorpusDiff(corpus) if corpus.ready and len(corpus.message_ids) > 0 else None
+    if not corpus_diff:
+        corpus = TitleCorpus()
+
+    batch = []
+    async for movie in movies_col.find({}, CORPUS_FIELDS).sort("views_count", -1):
+        batch.append(movie)
+        if len(batch) >= SEARCH_INDEX_BATCH:
+            await loop.run_in_executor(thread_pool_executor, feed_search_indexes, batch, corrector, index, corpus, corpus_diff)
+            batch = []
+    if batch:
+        await loop.run_in_executor(thread_pool_executor, feed_search_indexes, batch, corrector, index, corpus, corpus_diff)
+    index.ready = True
+
+    if corpus_diff:
+        for method, args in corpus_diff.updates():
+            getattr(corpus, method)(*args)
+    else:
+        corpus.ready = True
+        await loop.run_in_executor(thread_pool_executor, save_corpus_snapshot, corpus)
+    return corrector, index, corpus
+
+async def merge_title_corpus():
+    """overlay কে নতুন বেসে মার্জ করে স্ন্যাপশট সেভ করবে, মার্জের সময়ের পরিবর্তন স্বাপের আগে আবার চলবে"""
+    loop = asyncio.get_event_loop()
+    start_index_build()
+    try:
+        merged = await loop.run_in_executor(thread_pool_executor, title_corpus.merged)
+        await loop.run_in_executor(thread_pool_executor, save_corpus_snapshot, merged)
+    except Exception:
+        finish_index_build()
+        raise
+    finish_index_build(corpus=merged)
+    print(f"✅ Title Corpus Merged: {len(merged)} titles, {merged.memory_usage() / 1024 / 1024:.1f}/{CORPUS_MEMORY_BUDGET_MB} MB")
+
+async def corpus_merge_worker():
     while True:
-        async for group in groups_col.find({}):
-            chat_id = group["_id"]
+        await asyncio.sleep(CORPUS_MERGE_INTERVAL)
+        # অন্য কোনো বিল্ড চললে পরের বারে
+        if index_build is not None or not title_corpus.ready:
+            continue
+        if title_corpus.overlay_size() >= CORPUS_MERGE_MIN:
             try:
-                sent = await app.send_message(chat_id, AUTO_MESSAGE_TEXT)
-                if sent:
-                    asyncio.create_task(delete_message_later(chat_id, sent.id, delay=AUTO_MSG_DELETE_TIME))
-            except FloodWait as e:
-                await asyncio.sleep(e.value)
-            except (PeerIdInvalid, UserIsBlocked):
-                await groups_col.delete_one({"_id": chat_id})
-            except Exception:
-                pass
-            await asyncio.sleep(1.5) 
-        await asyncio.sleep(AUTO_MSG_INTERVAL)
+                await merge_title_corpus()
+            except Exception as e:
+                logger.error(f"Corpus Merge Error: {e}")
+
+def reset_search_indexes():
+    """সব মুভি ডিলিট হলে মেমোরির ইনডেক্সগুলোও খালি হবে"""
+    global title_index, title_corpus
+    title_index = TitleIndex()
+    title_index.ready = True
+    title_corpus = TitleCorpus()
+    title_corpus.ready = True
+    if index_build is not None:
+        index_build.reset = True
+
+async def learn_query_words(query):
+    """সফল সার্চের শব্দগুলো ডিকশনারিতে যোগ করবে"""
+    words = [w for w in clean_tokens(query) if len(w) >= 3 and not w.isdigit()]
+    for word in words:
+        apply_index_update(spell_corrector, "add_word", word)
+    if words:
+        await spell_vocab_col.bulk_write([UpdateOne({"_id": w}, {"$inc": {"count": 1}}, upsert=True) for w in words], ordered=False)
+
+# ------------------- ইনলাইন টাইটেল ইনডেক্স (Prefix + Trigram, In-Memory) -------------------
+class TitleIndex:
+    """
+    ইনলাইন মোডের জন্য মেমোরিতে রাখা টাইটেল ইনডেক্স।
+    ৩ অক্ষরের কম কুয়েরি প্রিফিক্স দিয়ে, বাকিগুলো ট্রাইগ্রাম ইন্টারসেকশন দিয়ে খোঁজা হয়।
+    পাইথন অবজেক্টের আনুমানিক সাইজ গুনে INLINE_INDEX_BUDGET_MB এর মধ্যে থাকে।
+    """
+    ENTRY_OVERHEAD = 240   # entries dict স্লট + tuple + দুটি str হেডার (আনুমানিক বাইট)
+    POSTING_OVERHEAD = 48  # কোনো gram এর set এ একটা message_id
+    GRAM_OVERHEAD = 220    # নতুন gram এর খালি set + dict স্লট
+
+    def __init__(self, budget_bytes=INLINE_INDEX_BUDGET_MB * 1024 * 1024):
+        self.entries = {}   # message_id -> (title, title_key, views_count)
+        self.grams = {}     # "^a", "^ab" (prefix) বা "abc" (trigram) -> set(message_id)
+        self.ready = False  # ক্যাটালগ থেকে পুরো ইনডেক্স বানানো শেষ হলে True
+        self.budget_bytes = budget_bytes
+        self.estimated_bytes = 0
+        self.truncated = False
+
+    @staticmethod
+    def _key(text):
+        return clean_text(text) or re.sub(r'[^a-z0-9]', '', text.lower())
+
+    @staticmethod
+    def _grams(key):
+        grams = {"^" + key[:1], "^" + key[:2]}
+        grams.update(key[i:i + 3] for i in range(len(key) - 2))
+        return grams
+
+    def _entry_size(self, title, key, grams):
+        return len(title) + len(key) + self.ENTRY_OVERHEAD + len(grams) * self.POSTING_OVERHEAD
+
+    def memory_usage(self):
+        return self.estimated_bytes
+
+    def add(self, message_id, title, views_count=0):
+        """বাজেট পার হলে False রিটার্ন করবে"""
+        key = self._key(title)
+        if not key: return False
+        self.remove(message_id)
+        grams = self._grams(key)
+        size = self._entry_size(title, key, grams) + self.GRAM_OVERHEAD * sum(1 for g in grams if g not in self.grams)
+        if self.estimated_bytes + size > self.budget_bytes:
+            self.truncated = True
+            return False
+        self.entries[message_id] = (title, key, views_count)
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(message_id)
+        self.estimated_bytes += size
+        return True
+
+    def remove(self, message_id):
+        entry = self.entries.pop(message_id, None)
+        if not entry: return
+        grams = self._grams(entry[1])
+        self.estimated_bytes -= self._entry_size(entry[0], entry[1], grams)
+        for gram in grams:
+            ids = self.grams.get(gram)
+            if ids:
+                ids.discard(message_id)
+                if not ids:
+                    del self.grams[gram]
+                    self.estimated_bytes -= self.GRAM_OVERHEAD
+
+    def bump_views(self, message_id, delta=1):
+        """watch_ এ ভিউ বাড়লে ইনলাইন র‍্যাংকিংও views_count এর সাথে মিলিয়ে রাখবে"""
+        entry = self.entries.get(message_id)
+        if entry:
+            self.entries[message_id] = (entry[0], entry[1], entry[2] + delta)
+
+    def search(self, query, limit=INLINE_RESULTS_COUNT):
+        key = self._key(query)
+        if not key: return []
+        if len(key) < 3:
+            ids = self.grams.get("^" + key, set())
+        else:
+            postings = sorted((self.grams.get(g, set()) for g in self._grams(key) if not g.startswith("^")), key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                if not ids: break
+                ids &= posting
+            ids = [mid for mid in ids if key in self.entries[mid][1]]
+        # শুরুতে মিললে আগে, তারপর বেশি ভিউ আগে
+        best = heapq.nsmallest(limit, ids, key=lambda mid: (not self.entries[mid][1].startswith(key), -self.entries[mid][2]))
+        return [(mid, self.entries[mid][0], self.entries[mid][2]) for mid in best]
+
+    def top(self, limit=INLINE_RESULTS_COUNT):
+        best = heapq.nlargest(limit, self.entries, key=lambda mid: self.entries[mid][2])
+        return [(mid, self.entries[mid][0], self.entries[mid][2]) for mid in best]
+
+title_index = TitleIndex()
+
+# ------------------- সার্চ লগ ও লার্নড কারেকশন ম্যাপ -------------------
+search_log_buffer = []
+search_logging_enabled = False  # search_logs capped নিশ্চিত হলেই True (না হলে insert এ uncapped কালেকশন তৈরি হবে)
+correction_map = {}  # query_clean -> target title_clean
+
+def log_search_event(event_type, user_id, **data):
+    """লগ সরাসরি DB তে না লিখে বাফারে রাখবে, worker ব্যাচ আকারে সেভ করবে"""
+    if not search_logging_enabled: return
+    search_log_buffer.append({"type": event_type, "user_id": user_id, "time": datetime.now(timezone.utc), **data})
+
+async def flush_search_logs():
+    global search_log_buffer
+    if not search_log_buffer: return
+    batch, search_log_buffer = search_log_buffer, []
+    try:
+        await search_logs_col.insert_many(batch, ordered=False)
+    except Exception as e:
+        logger.error(f"Search Log Error: {e}")
+
+def extract_correction_pairs(events):
+    """
+    লগ থেকে কারেকশন বের করবে:
+    ১. একই ইউজারের মিস (exact না) এর পর এক মিনিটের মধ্যে exact হিট -> miss_query -> hit_query
+    ২. TMDB দিয়ে রেজলভ হওয়া কুয়েরি -> query -> tmdb_clean
+    ৩. মিস সার্চের (exact না) পর CORRECTION_OPEN_WINDOW এর মধ্যে মুভি ওপেন -> miss_query -> ওপেন করা টাইটেল
+    প্রতিটি মিস সার্চ সর্বোচ্চ একটা জোড়া দেবে (প্রথম ফলাফলটাই), রিটার্ন: (miss, target, source, hit_time, user_id)
+    """
+    pairs = []
+    last_by_user = {}  # user_id -> এখনো জোড়া না পাওয়া শেষ মিস সার্চ
+    for event in events:
+        user_id = event["user_id"]
+        prev = last_by_user.get(user_id)
+        if event.get("type") == "open":
+            if (prev and event.get("title_clean")
+                    and (event["time"] - prev["time"]).total_seconds() <= CORRECTION_OPEN_WINDOW):
+                pairs.append((prev["query_clean"], event["title_clean"], "open", event["time"], user_id))
+                del last_by_user[user_id]
+            continue
+        if (prev and event["stage"] == "exact"
+                and prev["query_clean"] != event["query_clean"]
+                and (event["time"] - prev["time"]).total_seconds() <= CORRECTION_PAIR_WINDOW):
+            pairs.append((prev["query_clean"], event["query_clean"], "user", event["time"], user_id))
+        if event.get("stage") == "tmdb" and event.get("corrected"):
+            pairs.append((event["query_clean"], event["corrected"], "tmdb", event["time"], user_id))
+            last_by_user.pop(user_id, None)
+        elif event["stage"] == "exact":
+            last_by_user.pop(user_id, None)
+        else:
+            last_by_user[user_id] = event
+    return pairs
+
+def pick_corrections(docs):
+    """
+    প্রতিটি miss এর জন্য সবচেয়ে বেশি আলাদা ইউজারের target, তবে শুধু তখনই যখন সে একাই এগিয়ে
+    (টাই হলে কিছু না) এবং TMDB থেকে এসেছে অথবা CORRECTION_MIN_COUNT জন ইউজার নিশ্চিত করেছে
+    """
+    by_miss = {}
+    for doc in docs:
+        by_miss.setdefault(doc["miss"], []).append(doc)
+    new_map = {}
+    for miss, candidates in by_miss.items():
+        ranked = sorted(candidates, key=lambda d: len(d.get("users", [])), reverse=True)
+        best = ranked[0]
+        votes = len(best.get("users", []))
+        if len(ranked) > 1 and len(ranked[1].get("users", [])) >= votes:
+            continue
+        if "tmdb" in best.get("sources", []) or votes >= CORRECTION_MIN_COUNT:
+            new_map[miss] = best["target"]
+    return new_map
+
+async def rebuild_correction_map():
+    global correction_map
+    state = await settings_col.find_one({"key": "correction_map_built"})
+    # Mongo থেকে datetime naive (UTC) আসে
+    since = state["value"] if state else datetime(1970, 1, 1)
+    now = datetime.now(timezone.utc)
+
+    # বাউন্ডারির আগের উইন্ডোটুকুও পড়া হবে যেন মিস->হিট/ওপেন জোড়া না হারায়
+    lookback = max(CORRECTION_PAIR_WINDOW, CORRECTION_OPEN_WINDOW)
+    cursor = search_logs_col.find(
+        {"type": {"$in": ["search", "open"]}, "time": {"$gt": since - timedelta(seconds=lookback), "$lte": now}}
+    ).sort("time", ASCENDING)
+    events = [e async for e in cursor]
+    # আগের রানে গোনা জোড়া আবার যেন না গোনা হয় (hit_time > since)
+    ops = [
+        UpdateOne({"miss": miss, "target": target},
+                  {"$addToSet": {"users": user_id, "sources": source}, "$inc": {"count": 1}}, upsert=True)
+        for miss, target, source, hit_time, user_id in extract_correction_pairs(events)
+        if miss and target and miss != target and hit_time > since
+    ]
+    if ops:
+        await corrections_col.bulk_write(ops, ordered=False)
+    await settings_col.update_one({"key": "correction_map_built"}, {"$set": {"value": now}}, upsert=True)
+
+    correction_map = pick_corrections([c async for c in corrections_col.find({"miss": {"$exists": True}})])
+
+async def search_log_worker():
+    print("✅ সার্চ লগ ও কারেকশন ম্যাপ সিস্টেম চালু হয়েছে...")
+    last_rebuild = 0
+    while True:
+        await flush_search_logs()
+        if time.time() - last_rebuild >= CORRECTION_REBUILD_INTERVAL:
+            try:
+                await rebuild_correction_map()
+            except Exception as e:
+                logger.error(f"Correction Map Error: {e}")
+            last_rebuild = time.time()
+        await asyncio.sleep(SEARCH_LOG_FLUSH_INTERVAL)
+
+# ------------------- অটো গ্রুপ মেসেঞ্জার (Async Motor) -------------------
+class RateLimiter:
+    """সব টাস্কের জন্য একটাই রেট লিমিট (FloodWait এলে সবাই একসাথে থামবে)"""
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_slot = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+auto_msg_limiter = RateLimiter(AUTO_MSG_RATE)
+
+async def delete_messages_later(messages, delay):
+    """একটা ব্যাচের সব মেসেজ একসাথে শিডিউল হবে"""
+    run_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+    await scheduled_deletes_col.insert_many(
+        [{"chat_id": chat_id, "message_id": message_id, "run_at": run_at} for chat_id, message_id in messages],
+        ordered=False
+    )
+
+async def run_scheduled_deletes(job=None):
+    """সময় হয়ে যাওয়া মেসেজগুলো চ্যাট অনুযায়ী একসাথে ডিলিট করবে"""
+    while True:
+        due = await scheduled_deletes_col.find(
+            {"run_at": {"$lte": datetime.now(timezone.utc)}}
+        ).sort("run_at", ASCENDING).limit(DELETE_BATCH).to_list(length=DELETE_BATCH)
+        if not due: return
+
+        by_chat = {}
+        for item in due:
+            by_chat.setdefault(item["chat_id"], []).append(item["message_id"])
+        for chat_id, message_ids in by_chat.items():
+            for i in range(0, len(message_ids), 100):
+                await auto_msg_limiter.acquire()
+                try:
+                    await app.delete_messages(chat_id, message_ids[i:i + 100])
+                except FloodWait as e:
+                    auto_msg_limiter.pause(e.value)
+                except Exception:
+                    pass
+        await scheduled_deletes_col.delete_many({"_id": {"$in": [item["_id"] for item in due]}})
+        if len(due) < DELETE_BATCH: return
+
+async def auto_group_messenger(job=None):
+    """ডিউ হওয়া গ্রুপগুলোতে একবার ফ্যান-আউট (রিকারিং জব হিসেবে চলে)"""
+    sem = asyncio.Semaphore(AUTO_MSG_CONCURRENCY)
+
+    while True:
+        now = datetime.now(timezone.utc)
+        due_groups = await groups_col.find(
+            {"$or": [{"next_auto_msg": {"$lte": now}}, {"next_auto_msg": {"$exists": False}}]},
+            {"_id": 1}
+        ).limit(AUTO_MSG_BATCH).to_list(length=AUTO_MSG_BATCH)
+
+        if not due_groups:
+            return
+
+        sent_messages = []
+        done_ids = []
+        dead_ids = []
+
+        async def send_worker(chat_id):
+            async with sem:
+                await auto_msg_limiter.acquire()
+                try:
+                    sent = await app.send_message(chat_id, AUTO_MESSAGE_TEXT)
+                    if sent:
+                        sent_messages.append((chat_id, sent.id))
+                    done_ids.append(chat_id)
+                except FloodWait as e:
+                    # পরের রাউন্ডে আবার চেষ্টা হবে
+                    auto_msg_limiter.pause(e.value)
+                except (PeerIdInvalid, UserIsBlocked):
+                    dead_ids.append(chat_id)
+                except Exception:
+                    done_ids.append(chat_id)
+
+        await asyncio.gather(*[send_worker(group["_id"]) for group in due_groups])
+
+        # প্রতিটি গ্রুপের পরের সময় আলাদা করে সেভ, তাই গ্রুপ যত বেশিই হোক ইন্টারভাল ঠিক থাকবে
+        if done_ids:
+            next_time = datetime.now(timezone.utc) + timedelta(seconds=AUTO_MSG_INTERVAL)
+            await groups_col.update_many({"_id": {"$in": done_ids}}, {"$set": {"next_auto_msg": next_time}})
+        if dead_ids:
+            await groups_col.delete_many({"_id": {"$in": dead_ids}})
+        if sent_messages:
+            await delete_messages_later(sent_messages, AUTO_MSG_DELETE_TIME)
+        if len(due_groups) < AUTO_MSG_BATCH:
+            return
+
+# ------------------- অ্যাডমিন অ্যালার্ট কিউ (ডাইজেস্ট) -------------------
+admin_alert_queue = {}        # key -> {"text", "reply_markup", "count", "users"}
+admin_alert_recipients = {}   # normalized no-result query -> {user_id: ইউজারের লেখা কুয়েরি} (অ্যাডমিন রিপ্লাই সবাইকে যাবে)
+admin_alert_limiter = RateLimiter(ADMIN_ALERT_RATE)
+
+def queue_admin_alert(key, text, user_id, user_label, reply_markup=None):
+    """
+    ইউজার হ্যান্ডলার অ্যাডমিনদের মেসেজ পাঠানোর জন্য অপেক্ষা করবে না, শুধু কিউতে রাখবে।
+    একই key (একই কুয়েরি/মুভি) বারবার এলে কাউন্ট বাড়বে।
+    """
+    alert = admin_alert_queue.get(key)
+    if not alert:
+        alert = admin_alert_queue[key] = {"text": text, "reply_markup": reply_markup, "count": 0, "users": {}}
+    alert["count"] += 1
+    alert["users"][user_id] = user_label
+
+def add_alert_recipient(alert_key, user_id, query):
+    if len(admin_alert_recipients) >= 10000:
+        del admin_alert_recipients[next(iter(admin_alert_recipients))]
+    admin_alert_recipients.setdefault(alert_key, {})[user_id] = query
+
+def format_admin_alert(alert):
+    users = list(alert["users"].values())
+    user_text = ", ".join(users[:5]) + (f" +{len(users) - 5}" if len(users) > 5 else "")
+    return f"{alert['text']}\n🔁 {alert['count']} বার\n👤 {user_text}"
+
+async def send_to_admins(text, reply_markup=None):
+    for admin_id in ADMIN_IDS:
+        await admin_alert_limiter.acquire()
+        try:
+            await app.send_message(admin_id, text, reply_markup=reply_markup)
+        except FloodWait as e:
+            admin_alert_limiter.pause(e.value)
+        except Exception:
+            pass
+
+async def admin_alert_worker():
+    global admin_alert_queue
+    print("✅ অ্যাডমিন অ্যালার্ট ডাইজেস্ট চালু হয়েছে...")
+    while True:
+        await asyncio.sleep(ADMIN_ALERT_INTERVAL)
+        if not admin_alert_queue: continue
+        alerts, admin_alert_queue = admin_alert_queue, {}
+
+        # বেশি বার আসা অ্যালার্ট আগে, বাটনসহ আলাদা মেসেজে
+        ranked = sorted(alerts.values(), key=lambda a: a["count"], reverse=True)
+        for alert in ranked[:ADMIN_ALERT_MAX_PER_DIGEST]:
+            await send_to_admins(format_admin_alert(alert), alert["reply_markup"])
+
+        rest = ranked[ADMIN_ALERT_MAX_PER_DIGEST:]
+        if rest:
+            lines = [f"• {a['text'].splitlines()[-1]} ({a['count']})" for a in rest[:50]]
+            await send_to_admins(f"📋 **আরও {len(rest)} টি অ্যালার্ট:**\n" + "\n".join(lines))
 
 # ------------------- ব্রডকাস্ট ইঞ্জিন (Async) -------------------
-async def broadcast_messages(user_ids, message_func, status_msg=None, total_users=0):
+async def broadcast_messages(user_ids, message_func, status_msg=None, total_users=0, checkpoint=None):
+    """
+    checkpoint দিলে user_ids (_id অনুযায়ী সাজানো) ব্যাচে পাঠানো হবে এবং প্রতি ব্যাচ শেষে
+    checkpoint(শেষ user_id) কল হবে, যেন জব রিট্রাই হলে সেখান থেকে আবার শুরু হয়
+    """
     success = 0
     failed = 0
     blocked = 0
@@ -300,7 +1293,10 @@ async def broadcast_messages(user_ids, message_func, status_msg=None, total_user
                 except Exception:
                     failed += 1
             except (InputUserDeactivated, UserIsBlocked, PeerIdInvalid):
-                await users_col.delete_one({"_id": user_id})
+                try:
+                    await users_col.delete_one({"_id": user_id})
+                except Exception as e:
+                    logger.warning(f"Broadcast: failed to remove user {user_id}: {e}")
                 blocked += 1
                 failed += 1
             except Exception:
@@ -328,8 +1324,15 @@ async def broadcast_messages(user_ids, message_func, status_msg=None, total_user
                 except Exception: pass
 
     updater_task = asyncio.create_task(update_status_loop())
-    await asyncio.gather(*[send_worker(uid) for uid in user_ids])
-    updater_task.cancel()
+    try:
+        batch_size = BROADCAST_CHECKPOINT if checkpoint else max(len(user_ids), 1)
+        for i in range(0, len(user_ids), batch_size):
+            batch = user_ids[i:i + batch_size]
+            await asyncio.gather(*[send_worker(uid) for uid in batch])
+            if checkpoint:
+                await checkpoint(batch[-1])
+    finally:
+        updater_task.cancel()
 
     elapsed = time.time() - start_time
     final_text = f"✅ **ব্রডকাস্ট সম্পন্ন!**\n✅ সফল: `{success}`\n❌ ব্যর্থ: `{failed}`\n⏱ সময়: `{get_readable_time(elapsed)}`"
@@ -340,14 +1343,15 @@ async def broadcast_messages(user_ids, message_func, status_msg=None, total_user
         except: pass
     return success, failed
 
-async def auto_broadcast_worker(movie_title, message_id, thumbnail_id=None):
+async def auto_broadcast_worker(movie_title, message_id, thumbnail_id=None, job=None):
     download_button = InlineKeyboardMarkup([
         [InlineKeyboardButton("ডাউনলোড লিংক", url=f"https://t.me/{app.me.username}?start=watch_{message_id}")]
     ])
     notification_caption = f"🎬 **নতুন মুভি আপলোড হয়েছে!**\n\n**{movie_title}**\n\nএখনই ডাউনলোড করুন!"
     
     # Motor allows Async Iteration
-    all_user_ids = [user["_id"] async for user in users_col.find({"notify": {"$ne": False}}, {"_id": 1})]
+    user_filter = {"notify": {"$ne": False}, **job_resume_filter(job)}
+    all_user_ids = [user["_id"] async for user in users_col.find(user_filter, {"_id": 1}).sort("_id", ASCENDING)]
     total_users = len(all_user_ids)
     if total_users == 0: return
 
@@ -370,9 +1374,260 @@ async def auto_broadcast_worker(movie_title, message_id, thumbnail_id=None):
             msg = await app.send_message(user_id, notification_caption, reply_markup=download_button)
         if msg: asyncio.create_task(delete_message_later(msg.chat.id, msg.id, delay=86400))
 
-    await broadcast_messages(all_user_ids, send_func, status_msg, total_users)
+    await broadcast_messages(all_user_ids, send_func, status_msg, total_users, job_checkpoint(job))
+
+# ------------------- জব কিউ (MongoDB, Leased Jobs + Heartbeat) -------------------
+async def enqueue_job(job_type, payload=None, delay=0):
+    await jobs_col.insert_one({
+        "type": job_type,
+        "payload": payload or {},
+        "status": "pending",
+        "run_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+        "attempts": 0,
+        "created": datetime.now(timezone.utc)
+    })
+
+async def ensure_singleton_job(job_id, job_type, interval=None):
+    """একটাই কপি থাকবে (fixed _id); interval দিলে শেষ হওয়ার interval সেকেন্ড পর আবার চলবে"""
+    await jobs_col.update_one(
+        {"_id": job_id},
+        {"$setOnInsert": {"type": job_type, "payload": {}, "status": "pending", "interval": interval,
+                          "run_at": datetime.now(timezone.utc), "attempts": 0, "created": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+def job_resume_filter(job):
+    """আগের চেষ্টায় যতদূর পাঠানো হয়েছে তার পরের ইউজার থেকে শুরু (রিট্রাইয়ে ডাবল মেসেজ হবে না)"""
+    last_user_id = (job or {}).get("progress", {}).get("last_user_id")
+    return {"_id": {"$gt": last_user_id}} if last_user_id is not None else {}
+
+def job_checkpoint(job):
+    if not job:
+        return None
+
+    async def checkpoint(last_user_id):
+        await jobs_col.update_one({"_id": job["_id"]}, {"$set": {"progress.last_user_id": last_user_id}})
+    return checkpoint
+
+async def broadcast_job(job):
+    payload = job["payload"]
+    all_user_ids = [user["_id"] async for user in users_col.find(job_resume_filter(job), {"_id": 1}).sort("_id", ASCENDING)]
+    status_msg = None
+    try:
+        status_msg = await app.get_messages(payload["status_chat_id"], payload["status_message_id"])
+    except Exception:
+        pass
+
+    async def send_func(user_id):
+        if payload.get("reply_message_id"):
+            await app.copy_message(user_id, payload["from_chat_id"], payload["reply_message_id"])
+        else:
+            await app.send_message(user_id, payload["text"], disable_web_page_preview=True)
+
+    await broadcast_messages(all_user_ids, send_func, status_msg, len(all_user_ids), job_checkpoint(job))
+
+async def auto_broadcast_job(job):
+    payload = job["payload"]
+    await auto_broadcast_worker(payload["movie_title"], payload["message_id"], payload.get("thumbnail_id"), job)
+
+async def backfill_phonetic_job(job):
+    await backfill_phonetic_keys()
+
+JOB_HANDLERS = {
+    "broadcast": broadcast_job,
+    "auto_broadcast": auto_broadcast_job,
+    "group_messages": auto_group_messenger,
+    "scheduled_deletes": run_scheduled_deletes,
+    "backfill_phonetic": backfill_phonetic_job,
+}
+
+async def expire_dead_jobs(now):
+    """
+    বারবার worker মেরে ফেলা জব (যেমন বড় ব্রডকাস্টে OOM) JOB_MAX_ATTEMPTS পর আর নেওয়া হবে না:
+    এককালীন জব failed, interval জব পরের রাউন্ডে আবার শূন্য থেকে
+    """
+    dead = {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}}
+    await jobs_col.update_many(
+        {**dead, "interval": {"$in": [None, 0]}},
+        {"$set": {"status": "failed", "error": "lease expired (worker died)", "finished": now}}
+    )
+    async for job in jobs_col.find({**dead, "interval": {"$gt": 0}}, {"interval": 1}):
+        await jobs_col.update_one(
+            {"_id": job["_id"], "status": "running"},
+            {"$set": {"status": "pending", "attempts": 0, "error": "lease expired (worker died)",
+                      "run_at": now + timedelta(seconds=job["interval"])}}
+        )
+
+async def claim_job():
+    now = datetime.now(timezone.utc)
+    await expire_dead_jobs(now)
+    return await jobs_col.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "run_at": {"$lte": now}},
+            # লিজ শেষ (worker মারা গেছে) হলে অন্য worker নিবে, তবে সীমার বেশি চেষ্টা হবে না
+            {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}}
+        ]},
+        {"$set": {"status": "running", "worker": WORKER_ID, "started": now,
+                  "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("run_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def job_heartbeat(job_id):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await jobs_col.update_one(
+                {"_id": job_id, "worker": WORKER_ID},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+        except Exception as e:
+            # একবার ব্যর্থ হলেও লুপ চলবে, পরের বিটে লিজ আবার বাড়বে
+            logger.warning(f"Job Heartbeat Error ({job_id}): {e}")
+
+async def run_job(job):
+    heartbeat = asyncio.create_task(job_heartbeat(job["_id"]))
+    started = time.time()
+    error = None
+    try:
+        await JOB_HANDLERS[job["type"]](job)
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Job {job['type']} ({job['_id']}) failed: {e}")
+    finally:
+        heartbeat.cancel()
+
+    now = datetime.now(timezone.utc)
+    if job.get("interval"):
+        update = {"status": "pending", "attempts": 0, "run_at": now + timedelta(seconds=job["interval"])}
+    elif error and job["attempts"] < JOB_MAX_ATTEMPTS:
+        update = {"status": "pending", "run_at": now + timedelta(seconds=30 * job["attempts"])}
+    else:
+        update = {"status": "failed" if error else "done", "finished": now}
+    update["error"] = error
+    update["duration"] = round(time.time() - started, 2)
+    await jobs_col.update_one({"_id": job["_id"], "worker": WORKER_ID}, {"$set": update})
+
+async def job_worker():
+    print(f"✅ জব worker চালু হয়েছে ({WORKER_ID})...")
+    sem = asyncio.Semaphore(JOB_CONCURRENCY)
+
+    async def run_and_release(job):
+        try:
+            await run_job(job)
+        finally:
+            sem.release()
+
+    while True:
+        await sem.acquire()
+        try:
+            job = await claim_job()
+        except Exception as e:
+            logger.error(f"Job Claim Error: {e}")
+            job = None
+        if not job:
+            sem.release()
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            continue
+        if job["type"] not in JOB_HANDLERS:
+            await jobs_col.update_one({"_id": job["_id"]}, {"$set": {"status": "failed", "error": "unknown job type", "finished": datetime.now(timezone.utc)}})
+            sem.release()
+            continue
+        asyncio.create_task(run_and_release(job))
 
 # ------------------- চ্যানেল পোস্ট হ্যান্ডলার (Marshmallow Validation) -------------------
+def make_variant(data):
+    return {
+        "message_id": data["message_id"],
+        "title": data.get("title"),
+        "full_caption": data.get("full_caption"),
+        "caption_html": data.get("caption_html"),
+        "file_id": data.get("file_id"),
+        "file_unique_id": data.get("file_unique_id"),
+        "media_type": data.get("media_type"),
+    }
+
+async def find_duplicate_movie(data):
+    """
+    একই file_unique_id, একই title_clean + সাল, অথবা একই সালের প্রায় একই টাইটেল
+    (DUPLICATE_MIN_SCORE, সংখ্যাগুলো হুবহু মিলতে হবে যেন Pushpa ও Pushpa 2 আলাদা থাকে) হলে
+    সেই ক্যাটালগ এন্ট্রি রিটার্ন করবে
+    """
+    not_self = {"message_id": {"$ne": data["message_id"]}}
+    if data.get("file_unique_id"):
+        duplicate = await movies_col.find_one({
+            **not_self,
+            "$or": [{"file_unique_id": data["file_unique_id"]}, {"variants.file_unique_id": data["file_unique_id"]}]
+        })
+        if duplicate: return duplicate
+    if data.get("title_clean"):
+        duplicate = await movies_col.find_one({**not_self, "title_clean": data["title_clean"], "year": data.get("year")})
+        if duplicate: return duplicate
+    if data.get("year") and data.get("title_phonetic"):
+        title = clean_text(data["title"])
+        numbers = re.findall(r'\d+', title)
+        candidates = movies_col.find(
+            {**not_self, "year": data["year"], "title_phonetic": {"$all": data["title_phonetic"]}},
+            {"message_id": 1, "title": 1, "variants": 1}
+        ).limit(20)
+        async for candidate in candidates:
+            other = clean_text(candidate.get("title") or "")
+            if re.findall(r'\d+', other) == numbers and fuzz.ratio(title, other) >= DUPLICATE_MIN_SCORE:
+                return candidate
+    return None
+
+async def collapse_duplicate_post(data):
+    """
+    নতুন পোস্ট ডুপ্লিকেট হলে মূল এন্ট্রির variants এ যোগ করে True রিটার্ন করবে।
+    নিজেই ক্যাটালগ এন্ট্রি হলে (এডিট) কিছু করবে না।
+    """
+    if await movies_col.find_one({"message_id": data["message_id"]}, {"_id": 1}):
+        return False
+    duplicate = await find_duplicate_movie(data)
+    if not duplicate:
+        return False
+    await movies_col.update_one({"_id": duplicate["_id"]}, {"$pull": {"variants": {"message_id": data["message_id"]}}})
+    await movies_col.update_one({"_id": duplicate["_id"]}, {"$push": {"variants": make_variant(data)}})
+    logger.info(f"Duplicate post {data['message_id']} collapsed into {duplicate['message_id']}")
+    return True
+
+async def find_movie_entry(message_id):
+    """message_id (মূল বা ভ্যারিয়েন্ট) থেকে (movie, entry) রিটার্ন করবে"""
+    movie = await movies_col.find_one({"$or": [{"message_id": message_id}, {"variants.message_id": message_id}]})
+    if not movie:
+        return None, None
+    if movie["message_id"] == message_id:
+        return movie, movie
+    return movie, next(v for v in movie.get("variants", []) if v["message_id"] == message_id)
+
+async def deliver_movie(chat_id, entry, protect):
+    """file_id থাকলে cached media পাঠাবে (চ্যানেল হিস্টোরি লাগবে না), না হলে/ব্যর্থ হলে কপি করবে"""
+    if entry.get("file_id"):
+        # চ্যানেলের ফরম্যাটিং HTML হিসেবে রাখা থাকলে সেটাই, না হলে প্লেইন টেক্সট (মার্কডাউন পার্স হবে না)
+        if entry.get("caption_html"):
+            caption, parse_mode = entry["caption_html"], ParseMode.HTML
+        else:
+            caption, parse_mode = entry.get("full_caption") or "", ParseMode.DISABLED
+        try:
+            return await app.send_cached_media(
+                chat_id=chat_id,
+                file_id=entry["file_id"],
+                caption=caption,
+                parse_mode=parse_mode,
+                protect_content=protect
+            )
+        except FloodWait:
+            raise
+        except Exception as e:
+            logger.warning(f"Cached media failed for {entry['message_id']}, copying instead: {e}")
+    return await app.copy_message(
+        chat_id=chat_id,
+        from_chat_id=CHANNEL_ID,
+        message_id=entry["message_id"],
+        protect_content=protect
+    )
+
 @app.on_message(filters.chat(CHANNEL_ID))
 async def save_post(_, msg: Message):
     text = msg.text or msg.caption
@@ -384,6 +1639,10 @@ async def save_post(_, msg: Message):
     elif msg.video and msg.video.thumbs:
         thumbnail_file_id = msg.video.thumbs[0].file_id 
 
+    # ফাইলের file_id রাখা হবে, যেন ডেলিভারিতে চ্যানেল থেকে কপি করতে না হয়
+    media_type = next((t for t in ("video", "document", "audio") if getattr(msg, t, None)), None)
+    media = getattr(msg, media_type) if media_type else None
+
     movie_title = text.splitlines()[0]
     
     # Data Preparation
@@ -391,17 +1650,26 @@ async def save_post(_, msg: Message):
         "message_id": msg.id,
         "title": movie_title, 
         "full_caption": text, 
+        "caption_html": getattr(text, "html", None),
         "date": msg.date,
         "year": extract_year(text),
         "language": extract_language(text),
         "title_clean": clean_text(text), # Updated clean_text used here
+        "title_phonetic": get_phonetic_keys(movie_title),
         "views_count": 0,
-        "thumbnail_id": thumbnail_file_id 
+        "thumbnail_id": thumbnail_file_id,
+        "file_id": media.file_id if media else None,
+        "file_unique_id": media.file_unique_id if media else None,
+        "media_type": media_type
     }
 
     try:
         # Marshmallow Validation
         validated_data = movie_schema.load(raw_data)
+
+        # একই ফাইল বা একই টাইটেলের মুভি আগে থাকলে নতুন এন্ট্রি না করে ভ্যারিয়েন্ট হিসেবে যোগ হবে
+        if await collapse_duplicate_post(validated_data):
+            return
         
         # Async Motor Insert/Update
         result = await movies_col.update_one(
@@ -410,10 +1678,14 @@ async def save_post(_, msg: Message):
             upsert=True
         )
         
+        for word in clean_tokens(movie_title):
+            apply_index_update(spell_corrector, "add_word", word)
+        apply_index_update(title_index, "add", msg.id, movie_title, validated_data.get("views_count", 0))
+        apply_index_update(title_corpus, "add", msg.id, movie_title, validated_data["title_clean"], validated_data.get("views_count", 0), validated_data.get("language"))
+
         if result.upserted_id is not None:
-            setting = await settings_col.find_one({"key": "global_notify"})
-            if setting and setting.get("value"):
-                asyncio.create_task(auto_broadcast_worker(movie_title, msg.id, thumbnail_file_id))
+            if await get_setting("global_notify", False):
+                await enqueue_job("auto_broadcast", {"movie_title": movie_title, "message_id": msg.id, "thumbnail_id": thumbnail_file_id})
                 
     except ValidationError as err:
         logger.error(f"Schema Validation Error: {err.messages}")
@@ -442,20 +1714,26 @@ async def start(_, msg: Message):
     # Watch Logic (Async)
     if len(msg.command) > 1 and msg.command[1].startswith("watch_"):
         message_id = int(msg.command[1].replace("watch_", ""))
-        protect_setting = await settings_col.find_one({"key": "protect_forwarding"})
-        should_protect = protect_setting.get("value", True) if protect_setting else True
+        should_protect = await get_setting("protect_forwarding", True)
         
         try:
-            copied_message = await app.copy_message(
-                chat_id=msg.chat.id,        
-                from_chat_id=CHANNEL_ID,    
-                message_id=message_id,      
-                protect_content=should_protect 
-            )
-            movie_data = await movies_col.find_one({"message_id": message_id})
+            movie_data, entry = await find_movie_entry(message_id)
+            copied_message = await deliver_movie(msg.chat.id, entry or {"message_id": message_id}, should_protect)
             
             if movie_data:
-                action_buttons = InlineKeyboardMarkup([
+                # একই মুভির অন্য ভার্সন (ভিন্ন ফাইল) থাকলে সেগুলোর বাটন
+                other_versions = [movie_data] + movie_data.get("variants", [])
+                seen_files = {entry.get("file_unique_id")}
+                version_rows = []
+                for version in other_versions:
+                    if version["message_id"] == message_id or (version.get("file_unique_id") and version["file_unique_id"] in seen_files):
+                        continue
+                    seen_files.add(version.get("file_unique_id"))
+                    version_rows.append([InlineKeyboardButton(
+                        f"📁 {(version.get('full_caption') or version.get('title') or '').split(chr(10))[0][:40]}",
+                        url=f"https://t.me/{app.me.username}?start=watch_{version['message_id']}"
+                    )])
+                action_buttons = InlineKeyboardMarkup(version_rows + [
                     [InlineKeyboardButton("⚠️ রিপোর্ট / সমস্যা (Report)", callback_data=f"report_{message_id}")]
                 ])
                 report_message = await app.send_message(
@@ -468,7 +1746,12 @@ async def start(_, msg: Message):
                 asyncio.create_task(delete_message_later(copied_message.chat.id, copied_message.id))
             
             # Atomic Update
-            await movies_col.update_one({"message_id": message_id}, {"$inc": {"views_count": 1}})
+            if movie_data:
+                await movies_col.update_one({"_id": movie_data["_id"]}, {"$inc": {"views_count": 1}})
+                apply_index_update(title_index, "bump_views", movie_data["message_id"])
+            if movie_data:
+                # আগের সার্চের সাথে জোড়া লাগিয়ে কারেকশন শেখার জন্য (query -> ওপেন করা টাইটেল)
+                log_search_event("open", msg.from_user.id, message_id=message_id, title_clean=clean_text(movie_data.get("title") or ""))
             
         except Exception:
             error_msg = await msg.reply_text("মুভিটি খুঁজে পাওয়া যায়নি বা লোড করা যায়নি।")
@@ -514,9 +1797,8 @@ async def broadcast(_, msg: Message):
         await msg.reply("ব্যবহার:\n১. কোনো মেসেজে রিপ্লাই দিয়ে `/broadcast` লিখুন।\n২. অথবা `/broadcast আপনার মেসেজ` লিখুন।")
         return
     
-    # Async Fetch
-    all_user_ids = [user["_id"] async for user in users_col.find({}, {"_id": 1})]
-    total_users = len(all_user_ids)
+    # Async Count (ইউজার লিস্ট worker নিজেই পড়বে)
+    total_users = await users_col.count_documents({})
     
     if total_users == 0:
         await msg.reply("ডাটাবেসে কোনো ইউজার নেই।")
@@ -524,14 +1806,14 @@ async def broadcast(_, msg: Message):
         
     status_msg = await msg.reply_photo(photo=BROADCAST_PIC, caption=f"🚀 **ম্যানুয়াল ব্রডকাস্ট শুরু...**\n👥 টার্গেট: `{total_users}`")
     
-    async def send_func(user_id):
-        if msg.reply_to_message:
-            await msg.reply_to_message.copy(user_id)
-        else:
-            broadcast_text = msg.text.split(None, 1)[1]
-            await app.send_message(user_id, broadcast_text, disable_web_page_preview=True)
-
-    await broadcast_messages(all_user_ids, send_func, status_msg, total_users)
+    # ব্রডকাস্ট worker প্রসেসে চলবে, এই হ্যান্ডলার শুধু জব কিউতে পাঠাবে
+    await enqueue_job("broadcast", {
+        "from_chat_id": msg.chat.id,
+        "reply_message_id": msg.reply_to_message.id if msg.reply_to_message else None,
+        "text": None if msg.reply_to_message else msg.text.split(None, 1)[1],
+        "status_chat_id": status_msg.chat.id,
+        "status_message_id": status_msg.id
+    })
 
 @app.on_message(filters.command("feedback") & filters.private)
 async def feedback(_, msg: Message):
@@ -561,7 +1843,9 @@ async def stats(_, msg: Message):
 মোট গ্রুপ: {total_groups}
 মোট মুভি: {total_movies}
 মোট ফিডব্যাক: {total_feedback}
-মোট অনুরোধ: {total_requests}"""
+মোট অনুরোধ: {total_requests}
+ফাজি কর্পাস: {len(title_corpus)} টাইটেল, {title_corpus.memory_usage() / 1024 / 1024:.1f}/{CORPUS_MEMORY_BUDGET_MB} MB
+ইনলাইন ইনডেক্স: {len(title_index.entries)} টাইটেল, ~{title_index.memory_usage() / 1024 / 1024:.1f}/{INLINE_INDEX_BUDGET_MB} MB"""
     )
     asyncio.create_task(delete_message_later(stats_msg.chat.id, stats_msg.id))
 
@@ -571,7 +1855,7 @@ async def notify_command(_, msg: Message):
         await msg.reply("ব্যবহার: /notify on অথবা /notify off")
         return
     new_value = True if msg.command[1] == "on" else False
-    await settings_col.update_one({"key": "global_notify"}, {"$set": {"value": new_value}}, upsert=True)
+    await set_setting("global_notify", new_value)
     status = "চালু" if new_value else "বন্ধ"
     await msg.reply(f"✅ গ্লোবাল নোটিফিকেশন {status} করা হয়েছে!")
 
@@ -581,7 +1865,7 @@ async def toggle_forward_protection(_, msg: Message):
         await msg.reply("ব্যবহার: /forward_toggle on (বন্ধ) / off (চালু)")
         return
     new_value = True if msg.command[1] == "on" else False
-    await settings_col.update_one({"key": "protect_forwarding"}, {"$set": {"value": new_value}}, upsert=True)
+    await set_setting("protect_forwarding", new_value)
     status = "বন্ধ" if new_value else "চালু"
     await msg.reply(f"✅ ফরওয়ার্ডিং {status} করা হয়েছে!")
 
@@ -599,10 +1883,51 @@ async def delete_specific_movie(_, msg: Message):
     
     if movie:
         await movies_col.delete_one({"_id": movie["_id"]})
+        apply_index_update(title_index, "remove", movie["message_id"])
+        apply_index_update(title_corpus, "remove", movie["message_id"])
         await msg.reply(f"মুভি **{movie['title']}** ডিলিট করা হয়েছে।")
     else:
         await msg.reply(f"**{title}** পাওয়া যায়নি।")
 
+async def merge_duplicate_group(ids):
+    """সবচেয়ে বেশি ভিউয়ের এন্ট্রি থাকবে, বাকিগুলো তার variants এ চলে যাবে"""
+    docs = await movies_col.find({"_id": {"$in": ids}}).sort("views_count", -1).to_list(length=None)
+    if len(docs) < 2:
+        return 0
+    primary, others = docs[0], docs[1:]
+    variants = []
+    for doc in others:
+        variants.append(make_variant(doc))
+        variants.extend(doc.get("variants", []))
+    await movies_col.update_one(
+        {"_id": primary["_id"]},
+        {"$push": {"variants": {"$each": variants}}, "$inc": {"views_count": sum(d.get("views_count", 0) for d in others)}}
+    )
+    await movies_col.delete_many({"_id": {"$in": [d["_id"] for d in others]}})
+    for doc in others:
+        apply_index_update(title_index, "remove", doc["message_id"])
+        apply_index_update(title_corpus, "remove", doc["message_id"])
+    return len(others)
+
+@app.on_message(filters.command("collapse_duplicates") & filters.user(ADMIN_IDS))
+async def collapse_duplicates_command(_, msg: Message):
+    status = await msg.reply("🔄 ডুপ্লিকেট মুভি খোঁজা হচ্ছে...")
+    pipelines = [
+        # একই ফাইল
+        [{"$match": {"file_unique_id": {"$type": "string"}}},
+         {"$group": {"_id": "$file_unique_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+         {"$match": {"count": {"$gt": 1}}}],
+        # একই টাইটেল + সাল
+        [{"$match": {"title_clean": {"$nin": ["", None]}}},
+         {"$group": {"_id": {"title_clean": "$title_clean", "year": "$year"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+         {"$match": {"count": {"$gt": 1}}}],
+    ]
+    merged = 0
+    for pipeline in pipelines:
+        async for group in movies_col.aggregate(pipeline, allowDiskUse=True):
+            merged += await merge_duplicate_group(group["ids"])
+    await status.edit_text(f"✅ {merged} টি ডুপ্লিকেট এন্ট্রি ভ্যারিয়েন্ট হিসেবে একত্র করা হয়েছে।")
+
 @app.on_message(filters.command("delete_all_movies") & filters.user(ADMIN_IDS))
 async def delete_all_movies_command(_, msg: Message):
     btn = InlineKeyboardMarkup([
@@ -615,22 +1940,31 @@ async def delete_all_movies_command(_, msg: Message):
 @app.on_callback_query(filters.regex(r"^noresult_(wrong|notyet|uploaded|coming|unreleased|processing)_(\d+)_([^ ]+)$") & filters.user(ADMIN_IDS))
 async def handle_admin_reply(_, cq: CallbackQuery):
     parts = cq.data.split("_", 3)
-    reason, user_id, original_query = parts[1], int(parts[2]), urllib.parse.unquote_plus(parts[3])
+    reason, user_id, alert_key = parts[1], int(parts[2]), urllib.parse.unquote_plus(parts[3])
 
     messages = {
-        "wrong": f"❌ **দুঃখিত! নামটিতে ভুল আছে।**\n\nভাইয়া, **'{original_query}'** নামে কোনো মুভি নেই বা বানান ভুল হয়েছে।",
-        "unreleased": f"🚫 **অপ্রকাশিত মুভি!**\n\nভাইয়া, **'{original_query}'** মুভিটি এখনো অফিসিয়ালি রিলিজ হয়নি।",
-        "uploaded": f"✅ **মুভিটি আমাদের কাছে আছে!**\n\nভাইয়া, **'{original_query}'** অলরেডি আছে। বানান ঠিক করে খুঁজুন।",
-        "processing": f"♻️ **কাজ চলছে!**\n\nভাইয়া, **'{original_query}'** নিয়ে কাজ চলছে। শীঘ্রই পাবেন।",
-        "coming": f"🚀 **শীঘ্রই আসবে!**\n\nভাইয়া, **'{original_query}'** খুব শীঘ্রই আসবে।",
-        "notyet": f"⏳ **এখনো আসেনি!**\n\n**'{original_query}'** এখনো আসেনি, তবে নোট করা হয়েছে।"
+        "wrong": "❌ **দুঃখিত! নামটিতে ভুল আছে।**\n\nভাইয়া, **'{query}'** নামে কোনো মুভি নেই বা বানান ভুল হয়েছে।",
+        "unreleased": "🚫 **অপ্রকাশিত মুভি!**\n\nভাইয়া, **'{query}'** মুভিটি এখনো অফিসিয়ালি রিলিজ হয়নি।",
+        "uploaded": "✅ **মুভিটি আমাদের কাছে আছে!**\n\nভাইয়া, **'{query}'** অলরেডি আছে। বানান ঠিক করে খুঁজুন।",
+        "processing": "♻️ **কাজ চলছে!**\n\nভাইয়া, **'{query}'** নিয়ে কাজ চলছে। শীঘ্রই পাবেন।",
+        "coming": "🚀 **শীঘ্রই আসবে!**\n\nভাইয়া, **'{query}'** খুব শীঘ্রই আসবে।",
+        "notyet": "⏳ **এখনো আসেনি!**\n\n**'{query}'** এখনো আসেনি, তবে নোট করা হয়েছে।"
     }
-    try:
-        sent = await app.send_message(user_id, messages[reason])
-        asyncio.create_task(delete_message_later(sent.chat.id, sent.id))
-        await cq.answer("Sent ✅", show_alert=True)
+    # ডাইজেস্টে একই কুয়েরি একাধিক ইউজার করলে সবাই উত্তর পাবে, প্রত্যেকে নিজের লেখা কুয়েরিসহ
+    recipients = admin_alert_recipients.pop(alert_key, {})
+    recipients.setdefault(user_id, alert_key)
+    sent_count = 0
+    for recipient, query in recipients.items():
+        try:
+            sent = await app.send_message(recipient, messages[reason].format(query=query))
+            asyncio.create_task(delete_message_later(sent.chat.id, sent.id))
+            sent_count += 1
+        except Exception:
+            pass
+    if sent_count:
+        await cq.answer(f"Sent ✅ ({sent_count})", show_alert=True)
         await cq.message.edit_reply_markup(None)
-    except Exception:
+    else:
         await cq.answer("Failed to send ❌", show_alert=True)
 
 @app.on_message(filters.command("popular") & (filters.private | filters.group))
@@ -679,67 +2013,130 @@ async def request_movie(_, msg: Message):
         InlineKeyboardButton("✅ সম্পন্ন", callback_data=f"req_fulfilled_{user_id}_{encoded_name}"),
         InlineKeyboardButton("❌ বাতিল", callback_data=f"req_rejected_{user_id}_{encoded_name}")
     ]])
-    for admin_id in ADMIN_IDS:
-        try:
-            await app.send_message(admin_id, f"❗ *নতুন অনুরোধ!*\n🎬 `{movie_name}`\n👤 [{username}](tg://user?id={user_id})", reply_markup=admin_btns)
-        except: pass
-
-# ------------------- স্মার্ট সার্চ হ্যান্ডলার (TMDB + Stop Words + DB) -------------------
-@app.on_message(filters.text & (filters.group | filters.private))
-async def search(_, msg: Message):
-    query = msg.text.strip()
-    if not query: return
-    
-    if msg.chat.type in ["group", "supergroup"]:
-        await groups_col.update_one({"_id": msg.chat.id}, {"$set": {"title": msg.chat.title, "active": True}}, upsert=True)
-        if len(query) < 3 or msg.reply_to_message or msg.from_user.is_bot: return
-        if not re.search(r'[a-zA-Z0-9]', query): return
-
-    user_id = msg.from_user.id
-    await users_col.update_one(
-        {"_id": user_id},
-        {"$set": {"last_query": query}, "$setOnInsert": {"joined": datetime.now(timezone.utc)}},
-        upsert=True
+    queue_admin_alert(
+        ("request", movie_name.lower()), f"❗ *নতুন অনুরোধ!*\n🎬 `{movie_name}`",
+        user_id, f"[{username}](tg://user?id={user_id})", admin_btns
     )
 
-    loading_message = await msg.reply("🔎 <b>Searching...</b>", quote=True)
-    
+# ------------------- ইনলাইন সার্চ হ্যান্ডলার (@bot <title>) -------------------
+@app.on_inline_query()
+async def inline_search(_, iq: InlineQuery):
+    query = iq.query.strip()
+    # শুধু মেমোরির ইনডেক্স থেকে উত্তর (MongoDB বা search হ্যান্ডলার লাগবে না)
+    if title_index.ready:
+        matches = title_index.search(query) if query else title_index.top()
+        cache_time = INLINE_CACHE_TIME
+    else:
+        # স্টার্টআপে ইনডেক্স লোড হওয়ার আগে MongoDB থেকে, আর অসম্পূর্ণ উত্তর Telegram ক্যাশ করবে না
+        query_clean = normalize_query(query) if query else ""
+        mongo_filter = {"title_clean": {"$regex": re.escape(query_clean)}} if query_clean else {}
+        cursor = movies_col.find(mongo_filter, {"message_id": 1, "title": 1, "views_count": 1}).sort("views_count", -1).limit(INLINE_RESULTS_COUNT)
+        matches = [(m["message_id"], m.get("title") or "", m.get("views_count", 0)) async for m in cursor]
+        cache_time = 0
+
+    results = []
+    for message_id, title, views in matches:
+        watch_url = f"https://t.me/{app.me.username}?start=watch_{message_id}"
+        results.append(InlineQueryResultArticle(
+            id=str(message_id),
+            title=title[:64],
+            description=f"{views} ভিউ",
+            input_message_content=InputTextMessageContent(f"🎬 **{title}**"),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("ডাউনলোড লিংক", url=watch_url)]])
+        ))
+
+    if results:
+        await iq.answer(results, cache_time=cache_time)
+    else:
+        await iq.answer(
+            [], cache_time=cache_time,
+            switch_pm_text="খুঁজে পাওয়া যায়নি - বটে সার্চ করুন", switch_pm_parameter="start"
+        )
+
+# ------------------- সার্চ পাইপলাইন (TMDB + Stop Words + DB) -------------------
+def normalize_query(query):
     # ১. ইউজার ইনপুট ক্লিন করা (Stop words removed)
     query_clean = clean_text(query)
     # যদি সব শব্দ বাদ পড়ে যায় (শুধু 'Movie' লিখলে), তাহলে অরিজিনাল ক্লিন টেক্সট নিবে
     if not query_clean: 
         query_clean = re.sub(r'[^a-zA-Z0-9]', '', query.lower())
+    return query_clean
+
+async def find_results(query):
+    """
+    পুরো সার্চ পাইপলাইন চালাবে (মেসেজ পাঠাবে না)।
+    রিটার্ন: (results, header, stage, corrected) - কিছু না পেলে results খালি থাকবে
+    """
+    query_clean = normalize_query(query)
 
     # --- [STEP 1] --- লোকাল ডাটাবেস চেক (Exact & Regex)
-    exact_match_cursor = movies_col.find({"title_clean": query_clean}).limit(RESULTS_COUNT)
-    exact_match = await exact_match_cursor.to_list(length=RESULTS_COUNT)
+    exact_match_cursor = movies_col.find({"title_clean": query_clean}).limit(MAX_RESULTS)
+    exact_match = await exact_match_cursor.to_list(length=MAX_RESULTS)
     
     regex_match_cursor = movies_col.find({
         "title_clean": {"$regex": re.escape(query_clean), "$options": "i"}
-    }).limit(RESULTS_COUNT)
-    regex_match = await regex_match_cursor.to_list(length=RESULTS_COUNT)
+    }).limit(MAX_RESULTS)
+    regex_match = await regex_match_cursor.to_list(length=MAX_RESULTS)
 
     final_results = exact_match + [m for m in regex_match if m["message_id"] not in [e["message_id"] for e in exact_match]]
     
     if final_results:
-        await loading_message.delete()
-        await send_results(msg, final_results[:RESULTS_COUNT])
-        return
+        return final_results[:MAX_RESULTS], None, "exact", None
+
+    # --- [STEP 1.5] --- Learned Correction Map (লগ থেকে শেখা বানান, ফাজি/এক্সটার্নাল লাগবে না)
+    learned_target = correction_map.get(query_clean)
+    if learned_target:
+        learned_cursor = movies_col.find({"title_clean": {"$regex": re.escape(learned_target), "$options": "i"}}).limit(MAX_RESULTS)
+        learned_results = await learned_cursor.to_list(length=MAX_RESULTS)
+
+        if learned_results:
+            best_match = learned_results[0]['title']
+            return learned_results, f"🤔 আপনি কি **{best_match}** খুঁজছেন?", "learned", None
+
+    # --- [STEP 2] --- Phonetic Index Lookup (বানান ভুল হলেও একটি ইনডেক্স কুয়েরিতেই খুঁজবে)
+    query_keys = get_phonetic_keys(query)
+    if query_keys:
+        phonetic_cursor = movies_col.find({"title_phonetic": {"$all": query_keys}}).sort("views_count", -1).limit(MAX_RESULTS * 4)
+        candidates = await phonetic_cursor.to_list(length=MAX_RESULTS * 4)
+
+        # স্কেলেটন লসি, তাই টাইটেলের সাথে আসল মিল যাচাই করে নেওয়া হবে
+        scored = [(fuzz.partial_ratio(query_clean, m.get("title_clean") or ""), m) for m in candidates]
+        scored = [item for item in scored if item[0] >= PHONETIC_MIN_SCORE]
+        scored.sort(key=lambda item: (item[0], item[1].get("views_count", 0)), reverse=True)
+        phonetic_results = [m for _, m in scored[:MAX_RESULTS]]
+
+        if phonetic_results:
+            best_match = phonetic_results[0]['title']
+            return phonetic_results, f"🤔 আপনি কি **{best_match}** খুঁজছেন?", "phonetic", None
+
+    # --- [STEP 3] --- Offline Spell Corrector (নেটওয়ার্ক ছাড়া, মাইক্রোসেকেন্ডে)
+    tokens, corrected_tokens = spell_corrector.correct(query)
+    if corrected_tokens != tokens:
+        corrected_clean = "".join(corrected_tokens)
+        spell_cursor = movies_col.find({"title_clean": {"$regex": re.escape(corrected_clean), "$options": "i"}}).limit(MAX_RESULTS)
+        spell_results = await spell_cursor.to_list(length=MAX_RESULTS)
+
+        if spell_results:
+            return spell_results, f"🔤 আপনি কি **{' '.join(corrected_tokens)}** খুঁজছেন?", "spell", None
+
+    # --- [STEP 4] --- Fuzzy Search (ফোনেটিক ইনডেক্সেও না পাওয়া গেলে)
+    if title_corpus.ready:
+        corrected_suggestions = await asyncio.get_event_loop().run_in_executor(
+            thread_pool_executor, title_corpus.search, query_clean, 70, MAX_RESULTS
+        )
+    else:
+        # কর্পাস লোড হওয়ার আগে পুরোনো পদ্ধতি (DB থেকে)
+        all_movie_data = await movies_col.find({}, {"title_clean": 1, "original_title": "$title", "message_id": 1, "views_count": 1}).to_list(length=None)
 
-    # --- [STEP 2] --- Fuzzy Search (যদি সরাসরি না পাওয়া যায়)
-    all_movie_data = await movies_col.find({}, {"title_clean": 1, "original_title": "$title", "message_id": 1, "views_count": 1}).to_list(length=None)
-    
-    corrected_suggestions = await asyncio.get_event_loop().run_in_executor(
-        thread_pool_executor, find_corrected_matches, query_clean, all_movie_data, 70, RESULTS_COUNT
-    )
+        corrected_suggestions = await asyncio.get_event_loop().run_in_executor(
+            thread_pool_executor, find_corrected_matches, query_clean, all_movie_data, 70, MAX_RESULTS
+        )
 
     if corrected_suggestions:
-        await loading_message.delete()
         best_match = corrected_suggestions[0]['title']
-        await send_results(msg, corrected_suggestions, f"🤔 আপনি কি **{best_match}** খুঁজছেন?")
-        return
+        return corrected_suggestions, f"🤔 আপনি কি **{best_match}** খুঁজছেন?", "fuzzy", None
 
-    # --- [STEP 3] --- TMDB API Correction (NEW FEATURE) 🔥
+    # --- [STEP 5] --- TMDB API Correction (NEW FEATURE) 🔥
     # ডাটাবেসে বা ফাজিতেও না পেলে, এবার TMDB কে জিজ্ঞেস করবে
     tmdb_correction = await get_tmdb_suggestion(query)
     
@@ -749,30 +2146,56 @@ async def search(_, msg: Message):
         # যদি TMDB এর দেওয়া নাম আর ইউজারের সার্চ করা নাম আলাদা হয় (মানে বানান ভুল ছিল)
         if tmdb_clean != query_clean:
             # সঠিক নাম দিয়ে আবার ডাটাবেস চেক
-            tmdb_cursor = movies_col.find({"title_clean": {"$regex": tmdb_clean, "$options": "i"}}).limit(RESULTS_COUNT)
-            tmdb_results = await tmdb_cursor.to_list(length=RESULTS_COUNT)
+            tmdb_cursor = movies_col.find({"title_clean": {"$regex": tmdb_clean, "$options": "i"}}).limit(MAX_RESULTS)
+            tmdb_results = await tmdb_cursor.to_list(length=MAX_RESULTS)
             
             if tmdb_results:
-                await loading_message.delete()
-                await send_results(msg, tmdb_results, f"✨ **TMDB Corrected:**\nআপনি **'{query}'** খুঁজেছেন, কিন্তু সঠিক নাম **'{tmdb_correction}'**। রেজাল্ট:")
-                return
+                return tmdb_results, f"✨ **TMDB Corrected:**\nআপনি **'{query}'** খুঁজেছেন, কিন্তু সঠিক নাম **'{tmdb_correction}'**। রেজাল্ট:", "tmdb", tmdb_clean
 
-    # --- [STEP 4] --- Google Fallback (Last Resort)
+    # --- [STEP 6] --- Google Fallback (Last Resort)
     # TMDB তেও না পেলে গুগলে চেক করবে (BS4)
-    google_correction = await google_spell_check(query)
+    google_correction = await google_spell_check(query) if GOOGLE_SPELL_CHECK else None
     if google_correction:
         google_clean = clean_text(google_correction)
         if google_clean != query_clean and google_clean != clean_text(tmdb_correction or ""):
-            bs4_cursor = movies_col.find({"title_clean": {"$regex": google_clean, "$options": "i"}}).limit(RESULTS_COUNT)
-            bs4_results = await bs4_cursor.to_list(length=RESULTS_COUNT)
+            bs4_cursor = movies_col.find({"title_clean": {"$regex": google_clean, "$options": "i"}}).limit(MAX_RESULTS)
+            bs4_results = await bs4_cursor.to_list(length=MAX_RESULTS)
             
             if bs4_results:
-                await loading_message.delete()
-                await send_results(msg, bs4_results, f"🌐 **Google Suggestion:**\nআমরা **'{google_correction}'** এর জন্য রেজাল্ট পেয়েছি:")
-                return
+                return bs4_results, f"🌐 **Google Suggestion:**\nআমরা **'{google_correction}'** এর জন্য রেজাল্ট পেয়েছি:", "google", google_clean
+
+    return [], None, "none", None
+
+# ------------------- স্মার্ট সার্চ হ্যান্ডলার (TMDB + Stop Words + DB) -------------------
+@app.on_message(filters.text & (filters.group | filters.private))
+async def search(_, msg: Message):
+    query = msg.text.strip()
+    if not query or msg.via_bot: return
+    
+    if msg.chat.type in ["group", "supergroup"]:
+        await groups_col.update_one({"_id": msg.chat.id}, {"$set": {"title": msg.chat.title, "active": True}}, upsert=True)
+        if len(query) < 3 or msg.reply_to_message or msg.from_user.is_bot: return
+        if not re.search(r'[a-zA-Z0-9]', query): return
 
-    # --- [STEP 5] --- No Result Found
+    user_id = msg.from_user.id
+    await users_col.update_one(
+        {"_id": user_id},
+        {"$set": {"last_query": query}, "$setOnInsert": {"joined": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+    loading_message = await msg.reply("🔎 <b>Searching...</b>", quote=True)
+    results, header, stage, corrected = await find_results(query)
     await loading_message.delete()
+    log_search_event("search", user_id, query=query, query_clean=normalize_query(query), stage=stage, corrected=corrected)
+
+    if results:
+        await send_results(msg, results, header)
+        if stage == "exact":
+            asyncio.create_task(learn_query_words(query))
+        return
+
+    # --- [STEP 7] --- No Result Found
     Google_Search_url = "https://www.google.com/search?q=" + urllib.parse.quote(query)
     req_btn = InlineKeyboardButton("এই মুভির জন্য অনুরোধ করুন", callback_data=f"request_movie_{user_id}_{urllib.parse.quote_plus(query)}")
     google_btn = InlineKeyboardButton("গুগলে সার্চ করুন", url=Google_Search_url)
@@ -783,26 +2206,87 @@ async def search(_, msg: Message):
     )
     asyncio.create_task(delete_message_later(alert.chat.id, alert.id))
     
-    # Admin Alert
-    encoded_query = urllib.parse.quote_plus(query)
+    # Admin Alert (ডাইজেস্ট, রিসিপিয়েন্ট ও বাটন সব একই নরমালাইজড কী দিয়ে)
+    alert_key = normalize_query(query)
+    encoded_query = urllib.parse.quote_plus(alert_key)
     admin_btns = get_admin_alert_buttons(user_id, encoded_query)
-    for admin_id in ADMIN_IDS:
-        try:
-            await app.send_message(admin_id, f"❗ *No Result!*\n🔍 Search: `{query}`\n👤 User: [{msg.from_user.first_name}](tg://user?id={user_id})", reply_markup=admin_btns)
-        except: pass
-
-async def send_results(msg, results, header="🎬 আপনার কাঙ্ক্ষিত মুভি পাওয়া গেছে:"):
+    queue_admin_alert(
+        ("noresult", alert_key), f"❗ *No Result!*\n🔍 Search: `{query}`",
+        user_id, f"[{msg.from_user.first_name}](tg://user?id={user_id})", admin_btns
+    )
+    add_alert_recipient(alert_key, user_id, query)
+
+RESULTS_HEADER = "🎬 আপনার কাঙ্ক্ষিত মুভি পাওয়া গেছে:"
+result_cache = {}  # result_id -> (expires_at, header, [(message_id, title, views_count)])
+
+def cache_results(results, header):
+    """পুরো র‍্যাঙ্কড রেজাল্ট লিস্ট ছোট একটা আইডির নিচে রাখবে (পেজ বদলাতে DB লাগবে না)"""
+    now = time.time()
+    if len(result_cache) >= RESULT_CACHE_MAX:
+        for rid in [rid for rid, cached in result_cache.items() if cached[0] < now]:
+            del result_cache[rid]
+        if len(result_cache) >= RESULT_CACHE_MAX:
+            del result_cache[next(iter(result_cache))]  # সবচেয়ে পুরোনোটা
+    rid = secrets.token_hex(4)
+    compact = [(m['message_id'], m.get('title') or m.get('original_title'), m.get('views_count', 0)) for m in results]
+    result_cache[rid] = (now + RESULT_CACHE_TTL, header, compact)
+    return rid
+
+def build_results_markup(rid, results, page=0):
+    pages = max(1, math.ceil(len(results) / RESULTS_COUNT))
+    page = min(max(page, 0), pages - 1)
     buttons = []
-    for movie in results:
-        title = movie.get('title') or movie.get('original_title')
+    for message_id, title, views in results[page * RESULTS_COUNT:(page + 1) * RESULTS_COUNT]:
         buttons.append([
             InlineKeyboardButton(
-                text=f"{title[:40]} ({movie.get('views_count', 0)} ভিউ)",
-                url=f"https://t.me/{app.me.username}?start=watch_{movie['message_id']}"
+                text=f"{title[:40]} ({views} ভিউ)",
+                url=f"https://t.me/{app.me.username}?start=watch_{message_id}"
             )
         ])
-    m = await msg.reply(header, reply_markup=InlineKeyboardMarkup(buttons), quote=True)
-    asyncio.create_task(delete_message_later(m.chat.id, m.id))
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"page_{rid}_{page - 1}"))
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="page_info"))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{rid}_{page + 1}"))
+        buttons.append(nav)
+    return InlineKeyboardMarkup(buttons)
+
+async def send_results(msg, results, header=None):
+    header = header or RESULTS_HEADER
+    rid = cache_results(results, header)
+    m = await msg.reply(header, reply_markup=build_results_markup(rid, result_cache[rid][2]), quote=True)
+    # মেসেজ আর ক্যাশ একসাথে শেষ হবে, মেসেজ চলে যাওয়ার পর ক্যাশ রাখার মানে নেই
+    asyncio.create_task(delete_message_later(m.chat.id, m.id, delay=RESULT_CACHE_TTL))
+
+async def handle_results_page(cq: CallbackQuery):
+    parts = cq.data.split("_")
+    if len(parts) != 3:
+        await cq.answer()
+        return
+    rid, page = parts[1], int(parts[2])
+
+    cached = result_cache.get(rid)
+    if cached and cached[0] >= time.time():
+        await cq.message.edit_reply_markup(build_results_markup(rid, cached[2], page))
+        await cq.answer()
+        return
+
+    # মেয়াদ শেষ হলে ইউজারের অরিজিনাল মেসেজ থেকে আবার সার্চ চালানো হবে
+    original = cq.message.reply_to_message
+    query = original.text.strip() if original and original.text else None
+    if not query:
+        await cq.answer("রেজাল্টের মেয়াদ শেষ, আবার সার্চ করুন।", show_alert=True)
+        return
+    await cq.answer("🔎 Searching...")
+    results, header, _, _ = await find_results(query)
+    if not results:
+        await cq.message.edit_text(f"❌ দুঃখিত! **'{query}'** খুঁজে পাওয়া যায়নি।")
+        return
+    header = header or RESULTS_HEADER
+    rid = cache_results(results, header)
+    await cq.message.edit_text(header, reply_markup=build_results_markup(rid, result_cache[rid][2], page))
 
 def get_admin_alert_buttons(user_id, encoded_query):
     return InlineKeyboardMarkup([
@@ -856,23 +2340,22 @@ async def callback_handler(_, cq: CallbackQuery):
     elif data.startswith("report_"):
         try:
             mid = int(data.split("_")[1])
-            movie = await movies_col.find_one({"message_id": mid})
+            movie, _ = await find_movie_entry(mid)
             title = movie.get("title", "Unknown") if movie else "Unknown"
             await cq.answer("রিপোর্ট পাঠানো হয়েছে ✅", show_alert=True)
-            for aid in ADMIN_IDS:
-                try: await app.send_message(aid, f"🚨 **Report!**\n🎬 {title}\n🆔 `{mid}`\n👤 {cq.from_user.mention}")
-                except: pass
+            queue_admin_alert(("report", mid), f"🚨 **Report!**\n🎬 {title}\n🆔 `{mid}`", cq.from_user.id, cq.from_user.mention)
         except: await cq.answer("Error!", show_alert=True)
             
     elif data == "confirm_delete_all_movies":
         await movies_col.delete_many({})
+        reset_search_indexes()
         await cq.message.edit_text("✅ সব ডিলিট করা হয়েছে।")
 
     elif data == "cancel_delete_all_movies":
         await cq.message.edit_text("❌ বাতিল করা হয়েছে।")
 
     elif data.startswith("request_movie_"):
-        _, uid, enc_name = data.split("_", 2)
+        uid, enc_name = data[len("request_movie_"):].split("_", 1)
         name = urllib.parse.unquote_plus(enc_name)
         await requests_col.insert_one({
             "user_id": int(uid),
@@ -886,15 +2369,73 @@ async def callback_handler(_, cq: CallbackQuery):
         
         # Admin Notification for Inline Request
         btns = InlineKeyboardMarkup([[InlineKeyboardButton("Done", callback_data="noop")]])
-        for aid in ADMIN_IDS:
-            try: await app.send_message(aid, f"❗ *Inline Req*\n🎬 `{name}`\n👤 {cq.from_user.mention}", reply_markup=btns)
-            except: pass
+        queue_admin_alert(("inline_request", name.lower()), f"❗ *Inline Req*\n🎬 `{name}`", cq.from_user.id, cq.from_user.mention, btns)
+
+    elif data.startswith("page_"):
+        await handle_results_page(cq)
 
     elif "_" in data:
         await cq.answer()
 
+# ------------------- স্টার্টআপ (Non-blocking) -------------------
+async def timed(name, coro):
+    started = time.time()
+    try:
+        await coro
+        logger.info(f"Startup: {name} ready in {time.time() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Startup: {name} failed after {time.time() - started:.2f}s: {e}")
+
+async def background_startup():
+    global search_logging_enabled
+    # ইনডেক্স/ক্যাপড কালেকশন আগে নিশ্চিত হবে, capped নিশ্চিত হলে তবেই লগ worker চালু হবে
+    await timed("indexes", ensure_indexes())
+    try:
+        search_logging_enabled = bool((await search_logs_col.options()).get("capped"))
+    except Exception as e:
+        logger.error(f"Search Log Collection Check Error: {e}")
+    if search_logging_enabled:
+        asyncio.create_task(search_log_worker())
+    else:
+        logger.error("search_logs is missing or not capped, search logging and learned corrections are disabled")
+    # ভারী কাজগুলো জব কিউতে (BOT_ROLE=worker প্রসেস বা এই প্রসেসের job_worker চালাবে)
+    await ensure_singleton_job("group_messages", "group_messages", AUTO_MSG_TICK)
+    await ensure_singleton_job("scheduled_deletes", "scheduled_deletes", 5)
+    await ensure_singleton_job("backfill_phonetic", "backfill_phonetic")
+
+async def load_catalog():
+    # স্ন্যাপশট (mmap) আগে, যেন পুরো ক্যাটালগ পড়ার আগেই ফাজি সার্চ মেমোরি থেকে চলে
+    await timed("corpus snapshot", load_corpus_snapshot())
+    await timed("search indexes", load_search_indexes())
+    asyncio.create_task(corpus_merge_worker())
+
+async def main():
+    started = time.time()
+    start_flask()
+    # জরুরি অংশ: Telegram কানেকশন (app.me) ও সেটিংস ক্যাশ একসাথে
+    # (ক্লায়েন্ট স্টার্ট ব্যর্থ হলে প্রসেস থামবে, শুধু ওয়ার্ম-আপ timed এ মোড়ানো)
+    await asyncio.gather(app.start(), timed("settings cache", init_settings()))
+    print(f"🚀 Bot Started with TMDB Engine in {time.time() - started:.2f}s (@{app.me.username})")
+
+    # বাকি সব ব্যাকগ্রাউন্ডে (আপডেট হ্যান্ডলিং এর জন্য অপেক্ষা করবে না)
+    asyncio.create_task(load_catalog())
+    asyncio.create_task(background_startup())
+    asyncio.create_task(admin_alert_worker())
+    if BOT_ROLE == "all":
+        asyncio.create_task(job_worker())
+
+    await idle()
+    await app.stop()
+
+async def worker_main():
+    """BOT_ROLE=worker: শুধু জব কিউ প্রসেস করবে (আলাদা কোর/নোডে চালানো যায়)"""
+    started = time.time()
+    await asyncio.gather(app.start(), timed("indexes", ensure_indexes()))
+    print(f"🛠 Worker {WORKER_ID} Started in {time.time() - started:.2f}s (@{app.me.username})")
+    try:
+        await job_worker()
+    finally:
+        await app.stop()
+
 if __name__ == "__main__":
-    print("🚀 Bot Started with TMDB Engine...")
-    app.loop.create_task(init_settings())
-    app.loop.create_task(auto_group_messenger())
-    app.run()
+    app.run(worker_main() if BOT_ROLE == "worker" else main())